@@ -0,0 +1,41 @@
+"""index token_blacklist.expires_at
+
+Revision ID: 5c1f0e7a9b3d
+Revises: 02be14245c30
+Create Date: 2026-10-17 10:12:31.402118
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1f0e7a9b3d'
+down_revision: Union[str, Sequence[str], None] = '02be14245c30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 分批清理（blacklist_cleanup.purge_expired_blacklist）靠這個索引找過期列；
+    # PostgreSQL 用 CONCURRENTLY 建立，不鎖住登出 / refresh 的寫入
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_token_blacklist_expires_at'),
+            'token_blacklist',
+            ['expires_at'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            op.f('ix_token_blacklist_expires_at'),
+            table_name='token_blacklist',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,44 @@
+"""add refresh_sessions table
+
+Revision ID: 9e4b27d1c8a6
+Revises: 5c1f0e7a9b3d
+Create Date: 2026-10-17 11:02:47.518230
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4b27d1c8a6'
+down_revision: Union[str, Sequence[str], None] = '5c1f0e7a9b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('refresh_sessions',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('generation', sa.Integer(), nullable=False),
+    sa.Column('user_agent', sa.String(length=255), nullable=True),
+    sa.Column('ip', sa.String(length=64), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('last_used_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('revoked_at', sa.DateTime(), nullable=True),
+    sa.Column('revoked_reason', sa.String(length=32), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_refresh_sessions_expires_at'), 'refresh_sessions', ['expires_at'], unique=False)
+    op.create_index('ix_refresh_sessions_user_id_revoked_at', 'refresh_sessions', ['user_id', 'revoked_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_refresh_sessions_user_id_revoked_at', table_name='refresh_sessions')
+    op.drop_index(op.f('ix_refresh_sessions_expires_at'), table_name='refresh_sessions')
+    op.drop_table('refresh_sessions')
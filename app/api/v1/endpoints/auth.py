@@ -1,5 +1,5 @@
 # app/api/v1/endpoints/auth.py
-from typing import Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 from datetime import datetime as dt
 
 from fastapi import APIRouter, Depends, HTTPException, status, Header, Request
@@ -9,38 +9,77 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.session import get_db
 from app.models.users import User
-from app.models.token_blacklist import TokenBlacklist
-from app.core.deps import get_current_user
+from app.core.deps import get_current_user, get_current_user_cached
 from app.core.security import (
-    verify_password,
+    verify_password_async,
+    hash_password_async,
+    password_needs_rehash,
     create_access_token,
     create_refresh_token,
     decode_refresh_token,
     try_decode_any,  # 取出 jti/exp/type/sub 用
 )
-from app.schemas.auth import TokenPair, RefreshRequest
+from app.core.jwt_backends import peek_claims
+from app.schemas.auth import TokenPair, RefreshRequest, SessionRead
 from app.schemas.user import UserRead
 from app.services.rate_limit import check_limit_and_hit, reset_success
+from app.services.revocation_filter import record_revocation
+from app.services.refresh_sessions import (
+    RotateResult,
+    create_session,
+    list_active_sessions,
+    new_family_id,
+    revoke_all_sessions,
+    revoke_session,
+    rotate_session,
+)
+from app.services.revocation_store import is_token_revoked, revoke_token
+from app.services.user_cache import CachedUser, cache_user, invalidate_user
 
 router = APIRouter(tags=["auth"])
 
 
-def _extract_jti_and_exp(token: str) -> Tuple[Optional[str], Optional[int], Optional[str], Optional[str]]:
-    """從任一 JWT 取出 (jti, exp, type, sub)，exp 為 epoch 秒"""
+def _decode_claims(token: str) -> Dict[str, Any]:
+    """驗證並解出任一 JWT 的 claims；無效時回傳空 dict。"""
     try:
-        claims = try_decode_any(token)
-        jti = claims.get("jti")
-        exp = claims.get("exp")
-        typ = claims.get("type")
-        sub = claims.get("sub")
-        if exp is not None and not isinstance(exp, int):
-            try:
-                exp = int(getattr(exp, "timestamp")())  # 某些 jose 會給 datetime
-            except Exception:
-                exp = None
-        return jti, exp, typ, sub
+        return try_decode_any(token)
     except Exception:
+        return {}
+
+
+def _extract_jti_and_exp(token: str) -> Tuple[Optional[str], Optional[int], Optional[str], Optional[str]]:
+    """從任一 JWT 取出 (jti, exp, type, sub)，exp 為 epoch 秒"""
+    claims = _decode_claims(token)
+    if not claims:
         return None, None, None, None
+    jti = claims.get("jti")
+    exp = claims.get("exp")
+    typ = claims.get("type")
+    sub = claims.get("sub")
+    if exp is not None and not isinstance(exp, int):
+        try:
+            exp = int(getattr(exp, "timestamp")())  # 某些 jose 會給 datetime
+        except Exception:
+            exp = None
+    return jti, exp, typ, sub
+
+
+def _bearer(authorization: Optional[str]) -> Optional[str]:
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization.split(" ", 1)[1].strip()
+    return None
+
+
+def _client_ip(request: Request) -> str:
+    return (request.client.host if request.client else "unknown") or "unknown"
+
+
+def _issue_family_pair(user: User, family_id: str, generation: int) -> Tuple[str, str, dt]:
+    """簽發帶 family 的 token pair；回傳 (access, refresh, refresh 的 exp)。"""
+    base = {"sub": str(user.id), "ver": user.token_version, "fam": family_id}
+    access = create_access_token(base)
+    refresh = create_refresh_token({**base, "gen": generation})
+    return access, refresh, dt.utcfromtimestamp(peek_claims(refresh)["exp"])
 
 
 # === 登入（含 Redis Rate Limit） ===
@@ -54,8 +93,9 @@ async def login(
     使用者登入，簽發 Access / Refresh。
     security.py 會自動加入 type、jti、ver、exp。
     *改版：使用 Redis Sliding Window 限流*
+    每次登入建立一個 refresh family（RefreshSession），token 帶 fam / gen。
     """
-    ip = (request.client.host if request.client else "unknown") or "unknown"
+    ip = _client_ip(request)
     email = (form_data.username or "").strip()
 
     allowed, retry_after = await check_limit_and_hit(ip, email)
@@ -70,16 +110,22 @@ async def login(
     result = await db.execute(select(User).where(User.email == email))
     user = result.scalar_one_or_none()
 
-    if not user or not verify_password(password, user.password_hash):
+    if not user or not await verify_password_async(password, user.password_hash):
         # 統一訊息避免帳號探測
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
+    # ✅ cost 與目前設定不同的舊雜湊：趁有明文時透明升級（與 session 同一次 commit）
+    if password_needs_rehash(user.password_hash):
+        user.password_hash = await hash_password_async(password)
+
     # ✅ 登入成功後清空 email+IP 的嘗試（避免誤鎖）
     await reset_success(ip, email)
 
-    # ✅ 帶入當前 token_version 作為 ver
-    access_token = create_access_token({"sub": str(user.id), "ver": user.token_version})
-    refresh_token = create_refresh_token({"sub": str(user.id), "ver": user.token_version})
+    # ✅ 帶入當前 token_version 作為 ver；新 family 從 generation 0 開始
+    family_id = new_family_id()
+    access_token, refresh_token, refresh_exp = _issue_family_pair(user, family_id, 0)
+    create_session(db, family_id, user.id, refresh_exp, request.headers.get("user-agent"), ip)
+    await db.commit()
 
     return TokenPair(
         access_token=access_token,
@@ -88,9 +134,9 @@ async def login(
     )
 
 
-# === Refresh Token 兌換（舊 refresh 黑名單化 + ver 比對） ===
+# === Refresh Token 兌換（family 輪替 + ver 比對） ===
 @router.post("/refresh", response_model=TokenPair)
-async def refresh_token(payload: RefreshRequest, db: AsyncSession = Depends(get_db)):
+async def refresh_token(payload: RefreshRequest, request: Request, db: AsyncSession = Depends(get_db)):
     try:
         claims = decode_refresh_token(payload.refresh_token)
         if claims.get("type") != "refresh":
@@ -114,20 +160,41 @@ async def refresh_token(payload: RefreshRequest, db: AsyncSession = Depends(get_
     if token_ver is None or int(token_ver) != int(user.token_version):
         raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
 
-    # 帶入當前 token_version 簽發新 pair
-    new_access = create_access_token({"sub": str(user.id), "ver": user.token_version})
-    new_refresh = create_refresh_token({"sub": str(user.id), "ver": user.token_version})
+    family_id = claims.get("fam")
+    if family_id:
+        # 單一條件式 UPDATE 輪替；舊 generation 被重放時整個 family 會被撤銷
+        try:
+            generation = int(claims.get("gen"))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+        new_access, new_refresh, refresh_exp = _issue_family_pair(user, family_id, generation + 1)
+        rotated = await rotate_session(db, family_id, user.id, generation, refresh_exp)
+        await db.commit()
+        if rotated is RotateResult.REPLAY:
+            raise HTTPException(status_code=401, detail="Refresh token reuse detected; session revoked")
+        if rotated is not RotateResult.OK:
+            raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+        return TokenPair(access_token=new_access, refresh_token=new_refresh, token_type="bearer")
 
-    # 黑名單舊 refresh
+    # 舊版（無 family）的 refresh：檢查黑名單後黑名單化一次，並改發帶 family 的新 pair
     old_jti, old_exp, old_type, _ = _extract_jti_and_exp(payload.refresh_token)
+    if old_jti and await is_token_revoked(db, old_jti):
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+
+    family_id = new_family_id()
+    new_access, new_refresh, refresh_exp = _issue_family_pair(user, family_id, 0)
+    create_session(db, family_id, user.id, refresh_exp, request.headers.get("user-agent"), _client_ip(request))
     if old_jti and old_exp:
-        db.add(TokenBlacklist(
+        await revoke_token(
+            db,
             jti=old_jti,
             token_type=old_type or "refresh",
             user_id=int(user.id),
             expires_at=dt.utcfromtimestamp(old_exp),
-        ))
-        await db.commit()
+        )
+    await db.commit()
+    if old_jti and old_exp:
+        record_revocation(old_jti, dt.utcfromtimestamp(old_exp))
 
     return TokenPair(
         access_token=new_access,
@@ -144,29 +211,39 @@ async def logout(
     payload: Optional[RefreshRequest] = None,
     db: AsyncSession = Depends(get_db),
 ):
-    """單次登出：將 access / refresh 加入黑名單"""
-    if authorization and authorization.lower().startswith("bearer "):
-        access_token = authorization.split(" ", 1)[1].strip()
+    """單次登出：access 加入黑名單；refresh 所屬的 family 撤銷（舊版 refresh 則加入黑名單）"""
+    revoked = []
+    access_token = _bearer(authorization)
+    if access_token:
         a_jti, a_exp, a_type, _ = _extract_jti_and_exp(access_token)
         if a_jti and a_exp:
-            db.add(TokenBlacklist(
+            await revoke_token(
+                db,
                 jti=a_jti,
                 token_type=a_type or "access",
                 user_id=current_user.id,
                 expires_at=dt.utcfromtimestamp(a_exp),
-            ))
+            )
+            revoked.append((a_jti, dt.utcfromtimestamp(a_exp)))
 
     if payload and payload.refresh_token:
+        r_claims = _decode_claims(payload.refresh_token)
         r_jti, r_exp, r_type, _ = _extract_jti_and_exp(payload.refresh_token)
-        if r_jti and r_exp:
-            db.add(TokenBlacklist(
+        if r_claims.get("fam"):
+            await revoke_session(db, r_claims["fam"], current_user.id, reason="logout")
+        elif r_jti and r_exp:
+            await revoke_token(
+                db,
                 jti=r_jti,
                 token_type=r_type or "refresh",
                 user_id=current_user.id,
                 expires_at=dt.utcfromtimestamp(r_exp),
-            ))
+            )
+            revoked.append((r_jti, dt.utcfromtimestamp(r_exp)))
 
     await db.commit()
+    for jti, expires_at in revoked:
+        record_revocation(jti, expires_at)
     return {"detail": "Logged out"}
 
 
@@ -180,33 +257,70 @@ async def logout_all(
     """
     全部登出：
       - token_version 自增 → 舊 token 全失效
+      - 所有 refresh family 標記撤銷（裝置列表清空）
       - 將目前 access jti 加入黑名單
     """
     current_user.token_version = int(getattr(current_user, "token_version", 0)) + 1
+    await revoke_all_sessions(db, current_user.id)
     await db.commit()
     await db.refresh(current_user)
+    # 本 worker 的使用者快取立即換成新版本
+    invalidate_user(current_user.id)
+    cache_user(current_user)
 
-    if authorization and authorization.lower().startswith("bearer "):
-        access_token = authorization.split(" ", 1)[1].strip()
+    access_token = _bearer(authorization)
+    if access_token:
         a_jti, a_exp, a_type, _ = _extract_jti_and_exp(access_token)
         if a_jti and a_exp:
-            db.add(TokenBlacklist(
+            await revoke_token(
+                db,
                 jti=a_jti,
                 token_type=a_type or "access",
                 user_id=current_user.id,
                 expires_at=dt.utcfromtimestamp(a_exp),
-            ))
+            )
             await db.commit()
+            record_revocation(a_jti, dt.utcfromtimestamp(a_exp))
 
     return {"detail": "Logged out from all devices"}
 
 
+# === 我的裝置（refresh family）===
+@router.get("/sessions", response_model=List[SessionRead])
+async def list_sessions(
+    current_user: Union[User, CachedUser] = Depends(get_current_user_cached),
+    authorization: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
+    """列出目前有效的登入 session；current 標示發出這支 access token 的那一個。"""
+    access_token = _bearer(authorization)
+    current_family = _decode_claims(access_token).get("fam") if access_token else None
+    sessions = await list_active_sessions(db, current_user.id)
+    return [
+        SessionRead.model_validate(s).model_copy(update={"current": s.id == current_family})
+        for s in sessions
+    ]
+
+
+@router.delete("/sessions/{session_id}", response_model=dict)
+async def revoke_my_session(
+    session_id: str,
+    current_user: Union[User, CachedUser] = Depends(get_current_user_cached),
+    db: AsyncSession = Depends(get_db),
+):
+    """撤銷指定裝置的 refresh family（該裝置已發出的 access token 仍有效到 exp）。"""
+    if not await revoke_session(db, session_id, current_user.id, reason="user_revoke"):
+        raise HTTPException(status_code=404, detail="Session not found")
+    await db.commit()
+    return {"detail": "Session revoked"}
+
+
 # === 驗證 Token ===
 @router.get("/me", response_model=UserRead)
-async def read_me(current_user: User = Depends(get_current_user)):
+async def read_me(current_user: Union[User, CachedUser] = Depends(get_current_user_cached)):
     return current_user
 
 
 @router.get("/test-token", response_model=dict)
-async def test_token(current_user: User = Depends(get_current_user)) -> Dict[str, int]:
+async def test_token(current_user: Union[User, CachedUser] = Depends(get_current_user_cached)) -> Dict[str, int]:
     return {"ok": True, "user_id": current_user.id}
@@ -1,11 +1,13 @@
 # app/api/v1/endpoints/nutrition.py
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Union
 from pydantic import BaseModel, Field
 
-from app.core.deps import get_current_user
+from app.core.deps import get_current_user_cached
 from app.models.users import User
+from app.services.user_cache import CachedUser
 from app.ml.food_features import extract_features
+from app.services.rate_limit_policy import rate_limited
 
 router = APIRouter(tags=["nutrition"])
 
@@ -15,7 +17,7 @@ router = APIRouter(tags=["nutrition"])
 @router.get("/lookup", summary="Lookup nutrition (protected)")
 async def nutrition_lookup(
     q: str = Query(..., description="食材/餐點查詢字串"),
-    current_user: User = Depends(get_current_user),
+    current_user: Union[User, CachedUser] = Depends(get_current_user_cached),
 ):
     if not q:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="q is required")
@@ -64,7 +66,12 @@ def _match_and_calc_default(canonical: str, grams: float) -> Dict[str, Any]:
 _match_and_calc = _match_and_calc_default
 
 
-@router.post("/match", response_model=MatchResponse, summary="Match food label to TFND nutrition values")
+@router.post(
+    "/match",
+    response_model=MatchResponse,
+    summary="Match food label to TFND nutrition values",
+    dependencies=[Depends(rate_limited("api", cost=5))],  # difflib 比對，比一般請求貴
+)
 async def nutrition_match(payload: MatchRequest):
     if not payload.label.strip():
         raise HTTPException(status_code=400, detail="label is empty")
@@ -1,5 +1,5 @@
 # app/api/v1/endpoints/users.py
-from typing import List
+from typing import List, Union
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -7,13 +7,20 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
 from app.models.users import User
 from app.schemas.user import UserCreate, UserRead
-from app.core.security import hash_password
-from app.core.deps import get_current_user  # 保護需要登入的路由
+from app.core.security import hash_password_async
+from app.core.deps import get_current_user, get_current_user_cached  # 保護需要登入的路由
+from app.services.rate_limit_policy import rate_limited
+from app.services.user_cache import CachedUser
 
 router = APIRouter(tags=["users"])
 
-# === 註冊（開放） ===
-@router.post("/", response_model=UserRead, status_code=status.HTTP_201_CREATED)
+# === 註冊（開放；每次一個 bcrypt 雜湊，依 IP 限流） ===
+@router.post(
+    "/",
+    response_model=UserRead,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limited("signup"))],
+)
 async def create_user(
     payload: UserCreate,
     db: AsyncSession = Depends(get_db),
@@ -30,7 +37,7 @@ async def create_user(
     user = User(
         email=payload.email,
         name=payload.name,
-        password_hash=hash_password(payload.password),
+        password_hash=await hash_password_async(payload.password),
     )
     db.add(user)
     await db.commit()
@@ -48,5 +55,5 @@ async def list_users(
 
 # === 取得目前登入者（需要登入） ===
 @router.get("/me", response_model=UserRead)
-async def users_me(current_user: User = Depends(get_current_user)):
+async def users_me(current_user: Union[User, CachedUser] = Depends(get_current_user_cached)):
     return current_user
@@ -1,8 +1,10 @@
 # app/api/v1/endpoints/vision.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
 import base64
 
+from app.services.rate_limit_policy import content_length_cost, rate_limited
+
 router = APIRouter()
 
 class VisionAnalyzeIn(BaseModel):
@@ -12,7 +14,12 @@ class VisionAnalyzeOut(BaseModel):
     labels: list[str]
     model: str
 
-@router.post("/vision/analyze", response_model=VisionAnalyzeOut)
+# base64 解碼的成本與 payload 大小成正比：基本 10 單位，每 256 KiB 再加 1
+@router.post(
+    "/vision/analyze",
+    response_model=VisionAnalyzeOut,
+    dependencies=[Depends(rate_limited("api", cost=content_length_cost(base=10, per_bytes=256 * 1024)))],
+)
 async def analyze_image(payload: VisionAnalyzeIn):
     """
     Minimal stub for Phase 2 step-1.
@@ -0,0 +1,85 @@
+# app/core/cache.py
+"""
+行程內 LRU + TTL 快取（無鎖；僅在單一 event loop 內使用）。
+- maxsize：最多筆數，超過時淘汰最久未用的項目
+- max_weight：選用的總權重上限（例如以 bytes 估算的記憶體用量）
+- 每筆可有自己的 ttl；到期後讀取視為 miss 並移除
+"""
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        max_weight: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self.max_weight = max_weight
+        self._clock = clock
+        # key -> (value, stored_at, expires_at, weight)
+        self._data: "OrderedDict[K, Tuple[V, float, float, int]]" = OrderedDict()
+        self._weight = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def weight(self) -> int:
+        return self._weight
+
+    def get_entry(self, key: K) -> Optional[Tuple[V, float]]:
+        """回傳 (value, age_seconds)；不存在或已過期回傳 None。"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, stored_at, expires_at, _ = item
+        now = self._clock()
+        if now >= expires_at:
+            self.pop(key)
+            return None
+        self._data.move_to_end(key)
+        return value, now - stored_at
+
+    def get(self, key: K) -> Optional[V]:
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def set(self, key: K, value: V, ttl: Optional[float] = None, weight: int = 1) -> None:
+        ttl = self.ttl if ttl is None else float(ttl)
+        if ttl <= 0:
+            self.pop(key)
+            return
+        self.pop(key)
+        now = self._clock()
+        self._data[key] = (value, now, now + ttl, weight)
+        self._weight += weight
+        self._evict()
+
+    def pop(self, key: K) -> Optional[V]:
+        item = self._data.pop(key, None)
+        if item is None:
+            return None
+        self._weight -= item[3]
+        return item[0]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._weight = 0
+
+    def _evict(self) -> None:
+        while len(self._data) > self.maxsize or (
+            self.max_weight is not None and self._weight > self.max_weight and self._data
+        ):
+            _, item = self._data.popitem(last=False)
+            self._weight -= item[3]
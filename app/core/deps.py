@@ -1,5 +1,5 @@
 # app/core/deps.py
-from typing import Optional
+from typing import Any, Optional, Tuple, Union
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -8,8 +8,9 @@ from sqlalchemy import select
 from app.core.config import settings
 from app.db.session import get_db
 from app.models.users import User
-from app.models.token_blacklist import TokenBlacklist
 from app.core.security import decode_access_token  # 統一用 security 的解碼
+from app.services.revocation_store import is_token_revoked
+from app.services.user_cache import CachedUser, cache_user, get_cached_user
 
 
 # OAuth2 Password Flow 設定
@@ -19,68 +20,93 @@ oauth2_scheme = OAuth2PasswordBearer(
 )
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db),
-) -> User:
-    """
-    從 Bearer Access Token 解析目前使用者，並做進階驗證：
-      1️⃣ 驗證 JWT 與 exp
-      2️⃣ 確認 token.type == "access"
-      3️⃣ 驗證黑名單（是否已被登出）
-      4️⃣ 依 sub 查 DB 取得 User
-      5️⃣ 比對 ver == user.token_version，確保未被「全部登出」
-    """
-    unauthorized = HTTPException(
+def _unauthorized(detail: str = "Invalid or expired access token") -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Invalid or expired access token",
+        detail=detail,
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+def _parse_access_token(token: str) -> Tuple[int, Optional[str], Any]:
+    """解出 (user_id, jti, ver)；任何錯誤一律 401。"""
     try:
         payload = decode_access_token(token)
         if payload.get("type") != "access":
-            raise unauthorized
+            raise ValueError("not an access token")
 
         sub = payload.get("sub")
         if not sub:
-            raise unauthorized
-        user_id = int(sub)
+            raise ValueError("missing sub")
+        return int(sub), payload.get("jti"), payload.get("ver")
+    except Exception:
+        raise _unauthorized()
 
-        jti = payload.get("jti")
-        ver_in_token = payload.get("ver")
+
+def _check_version(user: Union[User, CachedUser], ver_in_token: Any) -> None:
+    # --- 版本比對（防止舊 token）---
+    try:
+        user_token_version = int(getattr(user, "token_version", 0))
+        ok = ver_in_token is not None and int(ver_in_token) == user_token_version
     except Exception:
-        raise unauthorized
-
-    # --- 黑名單檢查 ---
-    if jti:
-        q = select(TokenBlacklist).where(TokenBlacklist.jti == jti)
-        result = await db.execute(q)
-        if result.scalar_one_or_none():
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token has been revoked (blacklisted)",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+        raise _unauthorized()
+    if not ok:
+        raise _unauthorized("Token invalidated by global logout")
+
+
+async def _check_blacklist(db: AsyncSession, jti: Optional[str]) -> None:
+    # --- 黑名單檢查（sql 後端：Bloom filter 否定時不查 DB；redis 後端：單一 EXISTS）---
+    if jti and await is_token_revoked(db, jti):
+        raise _unauthorized("Token has been revoked (blacklisted)")
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    """
+    從 Bearer Access Token 解析目前使用者，並做進階驗證：
+      1️⃣ 驗證 JWT 與 exp
+      2️⃣ 確認 token.type == "access"
+      3️⃣ 驗證黑名單（是否已被登出）
+      4️⃣ 依 sub 查 DB 取得 User
+      5️⃣ 比對 ver == user.token_version，確保未被「全部登出」
+    回傳完整 ORM 物件（可修改後 commit）；同時更新使用者快取。
+    """
+    user_id, jti, ver_in_token = _parse_access_token(token)
+    await _check_blacklist(db, jti)
 
     # --- 取得使用者 ---
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
     if not user:
-        raise unauthorized
+        raise _unauthorized()
+    cache_user(user)
+
+    _check_version(user, ver_in_token)
+    return user
 
-    # --- 版本比對（防止舊 token）---
-    try:
-        user_token_version = int(getattr(user, "token_version", 0))
-        if ver_in_token is None or int(ver_in_token) != user_token_version:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token invalidated by global logout",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-    except Exception:
-        raise unauthorized
 
+async def get_current_user_cached(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> Union[User, CachedUser]:
+    """
+    與 get_current_user 相同的驗證，但允許回傳快取中的 CachedUser（唯讀投影）。
+    只需要 id / email / name 的端點請用這個：快取命中且黑名單 filter 否定時完全不碰 DB。
+    """
+    user_id, jti, ver_in_token = _parse_access_token(token)
+    await _check_blacklist(db, jti)
+
+    user: Union[User, CachedUser, None] = get_cached_user(user_id, ver_in_token)
+    if user is None:
+        result = await db.execute(select(User).where(User.id == user_id))
+        orm_user = result.scalar_one_or_none()
+        if not orm_user:
+            raise _unauthorized()
+        user = cache_user(orm_user)
+
+    _check_version(user, ver_in_token)
     return user
 
 
@@ -112,16 +138,14 @@ async def get_current_user_optional(
         return None
 
     # 黑名單檢查
-    if jti:
-        q = select(TokenBlacklist).where(TokenBlacklist.jti == jti)
-        result = await db.execute(q)
-        if result.scalar_one_or_none():
-            return None
+    if jti and await is_token_revoked(db, jti):
+        return None
 
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
     if not user:
         return None
+    cache_user(user)
 
     try:
         user_token_version = int(getattr(user, "token_version", 0))
@@ -4,11 +4,18 @@ from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
+from app.services.password_pool import PasswordHashBusy
+
 def register_error_handlers(app: FastAPI) -> None:
     @app.exception_handler(StarletteHTTPException)
     async def http_exc_handler(request: Request, exc: StarletteHTTPException):
         # 統一輸出格式
-        return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+        # 保留 exc.headers（Retry-After / RateLimit-* / WWW-Authenticate）
+        return JSONResponse(
+            status_code=exc.status_code,
+            content={"detail": exc.detail},
+            headers=getattr(exc, "headers", None),
+        )
 
     @app.exception_handler(RequestValidationError)
     async def validation_exc_handler(request: Request, exc: RequestValidationError):
@@ -18,6 +25,15 @@ def register_error_handlers(app: FastAPI) -> None:
             content={"detail": "Validation error", "errors": exc.errors()},
         )
 
+    @app.exception_handler(PasswordHashBusy)
+    async def password_busy_handler(request: Request, exc: PasswordHashBusy):
+        # 雜湊池滿載：請 client 稍後重試，而不是讓請求無限排隊
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server busy, please retry later"},
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+
     @app.middleware("http")
     async def add_security_headers(request: Request, call_next):
         # 小強化：避免洩露伺服器細節
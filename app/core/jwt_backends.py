@@ -0,0 +1,268 @@
+# app/core/jwt_backends.py
+"""
+JWT 簽章 / 驗證的後端層（security.py 只透過這裡呼叫）：
+- "jose"：python-jose（既有行為），key 物件預先以 jwk.construct 建好
+- "native"：標準函式庫 hmac/hashlib 直接實作 HS256/384/512，省去 jose 的通用解析開銷；
+  非對稱的 ES256 / EdDSA 則直接用 cryptography
+
+HS* token 兩者產出的位元組完全相同，可以互相驗證；錯誤一律丟 jose 的例外型別
+（JWTError / ExpiredSignatureError / JWTClaimsError），呼叫端不需區分後端。
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+from abc import ABC, abstractmethod
+from calendar import timegm
+from datetime import datetime
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+from jose import jwk, jwt
+from jose.exceptions import ExpiredSignatureError, JWTClaimsError, JWTError
+
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+def _split(token: str):
+    try:
+        raw = token.encode("utf-8")
+        signing_input, sig = raw.rsplit(b".", 1)
+        header_seg, payload_seg = signing_input.split(b".", 1)
+        return signing_input, header_seg, payload_seg, sig
+    except (ValueError, AttributeError):
+        raise JWTError("Not enough segments")
+
+
+def _load_segment(seg: bytes) -> Dict[str, Any]:
+    try:
+        obj = json.loads(_b64decode(seg))
+    except Exception:
+        raise JWTError("Invalid token segment")
+    if not isinstance(obj, Mapping):
+        raise JWTError("Invalid token segment: must be a json object")
+    return dict(obj)
+
+
+def peek_header(token: str) -> Dict[str, Any]:
+    """不驗證簽章地讀出 header（只可用於挑選 key）。"""
+    _, header_seg, _, _ = _split(token)
+    return _load_segment(header_seg)
+
+
+def peek_claims(token: str) -> Dict[str, Any]:
+    """不驗證簽章地讀出 claims（只可用於挑選 key）。"""
+    _, _, payload_seg, _ = _split(token)
+    return _load_segment(payload_seg)
+
+
+class JWTBackend(ABC):
+    name: str = ""
+
+    @abstractmethod
+    def load_key(self, key: str, algorithm: str) -> Any:
+        """把設定中的 secret 轉成可重複使用的 key 物件（啟動時做一次）。"""
+
+    @abstractmethod
+    def encode(self, claims: Dict[str, Any], key: Any, algorithm: str, headers: Optional[Dict[str, Any]] = None) -> str:
+        ...
+
+    @abstractmethod
+    def decode(self, token: str, key: Any, algorithm: str) -> Dict[str, Any]:
+        """驗證簽章與 exp/nbf/iat 等標準 claims；只接受指定的 algorithm。"""
+
+
+_HMAC_DIGESTS: Dict[str, Callable[..., Any]] = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512,
+}
+
+
+class _HmacKey:
+    """預先算好 inner/outer pad 的 HMAC 物件；每次簽章只需 copy()。"""
+
+    def __init__(self, secret: str, algorithm: str):
+        if algorithm not in _HMAC_DIGESTS:
+            raise JWTError(f"Unsupported algorithm for native backend: {algorithm}")
+        self.algorithm = algorithm
+        self._template = hmac.new(secret.encode("utf-8"), digestmod=_HMAC_DIGESTS[algorithm])
+
+    def sign(self, msg: bytes) -> bytes:
+        mac = self._template.copy()
+        mac.update(msg)
+        return mac.digest()
+
+    def verify(self, msg: bytes, sig: bytes) -> bool:
+        return hmac.compare_digest(self.sign(msg), sig)
+
+
+ASYMMETRIC_ALGORITHMS = ("ES256", "EdDSA")
+
+
+class AsymmetricKey:
+    """
+    ES256（P-256）或 EdDSA（Ed25519）key；PEM 可為私鑰（可簽可驗）或公鑰（只能驗）。
+    ES256 的簽章依 JWS 規格使用 raw r||s（64 bytes），不是 DER。
+    """
+
+    def __init__(self, pem: str, algorithm: str):
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            raise JWTError(f"Unsupported asymmetric algorithm: {algorithm}")
+        data = pem.encode("utf-8") if isinstance(pem, str) else pem
+        if b"PRIVATE KEY" in data:
+            self.private = serialization.load_pem_private_key(data, password=None)
+            self.public = self.private.public_key()
+        else:
+            self.private = None
+            self.public = serialization.load_pem_public_key(data)
+
+        if algorithm == "ES256":
+            ok = isinstance(self.public, ec.EllipticCurvePublicKey) and isinstance(self.public.curve, ec.SECP256R1)
+        else:
+            ok = isinstance(self.public, ed25519.Ed25519PublicKey)
+        if not ok:
+            raise JWTError(f"Key type does not match algorithm {algorithm}")
+        self.algorithm = algorithm
+
+    def sign(self, msg: bytes) -> bytes:
+        if self.private is None:
+            raise JWTError("Cannot sign with a public-only key")
+        if self.algorithm == "EdDSA":
+            return self.private.sign(msg)
+        r, s = decode_dss_signature(self.private.sign(msg, ec.ECDSA(hashes.SHA256())))
+        return r.to_bytes(32, "big") + s.to_bytes(32, "big")
+
+    def verify(self, msg: bytes, sig: bytes) -> bool:
+        try:
+            if self.algorithm == "EdDSA":
+                self.public.verify(sig, msg)
+            else:
+                if len(sig) != 64:
+                    return False
+                der = encode_dss_signature(int.from_bytes(sig[:32], "big"), int.from_bytes(sig[32:], "big"))
+                self.public.verify(der, msg, ec.ECDSA(hashes.SHA256()))
+            return True
+        except InvalidSignature:
+            return False
+
+
+def _int_date(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return timegm(value.utctimetuple())
+    return value
+
+
+def _validate_claims(claims: Dict[str, Any]) -> None:
+    """與 python-jose 預設選項一致的 claims 檢查（leeway=0、無 audience）。"""
+    now = timegm(datetime.utcnow().utctimetuple())
+    for name in ("iat", "nbf", "exp"):
+        if name in claims:
+            try:
+                int(claims[name])
+            except (TypeError, ValueError):
+                raise JWTClaimsError(f"{name} claim must be an integer.")
+    if "nbf" in claims and int(claims["nbf"]) > now:
+        raise JWTClaimsError("The token is not yet valid (nbf)")
+    if "exp" in claims and int(claims["exp"]) < now:
+        raise ExpiredSignatureError("Signature has expired.")
+    if "aud" in claims:
+        raise JWTClaimsError("Invalid audience")
+    for name in ("sub", "jti"):
+        if name in claims and not isinstance(claims[name], str):
+            raise JWTClaimsError(f"{name} claim must be a string.")
+
+
+class NativeBackend(JWTBackend):
+    name = "native"
+
+    def load_key(self, key: str, algorithm: str) -> Any:
+        if algorithm in ASYMMETRIC_ALGORITHMS:
+            return AsymmetricKey(key, algorithm)
+        return _HmacKey(key, algorithm)
+
+    def encode(self, claims, key, algorithm, headers=None) -> str:
+        claims = {k: (_int_date(v) if k in ("exp", "iat", "nbf") else v) for k, v in claims.items()}
+        header = {"typ": "JWT", "alg": algorithm}
+        if headers:
+            header.update(headers)
+        header_seg = _b64encode(json.dumps(header, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+        payload_seg = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+        signing_input = header_seg + b"." + payload_seg
+        return (signing_input + b"." + _b64encode(key.sign(signing_input))).decode("utf-8")
+
+    def decode(self, token, key, algorithm) -> Dict[str, Any]:
+        signing_input, header_seg, payload_seg, sig_seg = _split(token)
+        header = _load_segment(header_seg)
+        if header.get("alg") != algorithm or key.algorithm != algorithm:
+            raise JWTError("The specified alg value is not allowed")
+        try:
+            signature = _b64decode(sig_seg)
+        except Exception:
+            raise JWTError("Invalid crypto padding")
+        if not key.verify(signing_input, signature):
+            raise JWTError("Signature verification failed.")
+        claims = _load_segment(payload_seg)
+        _validate_claims(claims)
+        return claims
+
+
+class _JoseKeyPair:
+    """jose 的 EC 私鑰物件無法直接 verify：簽章用私鑰、驗證用其公鑰。"""
+
+    def __init__(self, key: Any):
+        self.sign_key = key
+        self.verify_key = key if key.is_public() else key.public_key()
+
+
+class JoseBackend(JWTBackend):
+    name = "jose"
+
+    def __init__(self):
+        # python-jose 3.3 不支援 EdDSA：這類 key 交給 native 實作
+        self._native = NativeBackend()
+
+    def load_key(self, key: str, algorithm: str) -> Any:
+        if algorithm == "EdDSA":
+            return self._native.load_key(key, algorithm)
+        if algorithm in ASYMMETRIC_ALGORITHMS:
+            return _JoseKeyPair(jwk.construct(key, algorithm))
+        return jwk.construct(key, algorithm)
+
+    def encode(self, claims, key, algorithm, headers=None) -> str:
+        if isinstance(key, AsymmetricKey):
+            return self._native.encode(claims, key, algorithm, headers)
+        if isinstance(key, _JoseKeyPair):
+            key = key.sign_key
+        return jwt.encode(claims, key, algorithm=algorithm, headers=headers)
+
+    def decode(self, token, key, algorithm) -> Dict[str, Any]:
+        if isinstance(key, AsymmetricKey):
+            return self._native.decode(token, key, algorithm)
+        if isinstance(key, _JoseKeyPair):
+            key = key.verify_key
+        return jwt.decode(token, key, algorithms=[algorithm])
+
+
+BACKENDS: Dict[str, Callable[[], JWTBackend]] = {
+    JoseBackend.name: JoseBackend,
+    NativeBackend.name: NativeBackend,
+}
+
+
+def get_backend(name: str) -> JWTBackend:
+    try:
+        return BACKENDS[(name or "jose").lower()]()
+    except KeyError:
+        raise ValueError(f"Unknown JWT_BACKEND={name!r}; choose one of {sorted(BACKENDS)}")
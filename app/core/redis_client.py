@@ -0,0 +1,233 @@
+# app/core/redis_client.py
+"""
+共用的 Redis client（限流、revocation store 等所有 Redis 使用者）：
+- BlockingConnectionPool：連線數上限 REDIS_MAX_CONNECTIONS，池滿時最多等 REDIS_POOL_TIMEOUT_MS；
+  socket / connect timeout 與 health check 取自 settings。
+- 每個指令（含 pipeline / MULTI）另有 REDIS_COMMAND_TIMEOUT_MS 的上限，Redis 卡住時請求不會跟著卡住。
+- Circuit breaker：連續 REDIS_BREAKER_FAILURES 次連線錯誤 / 逾時 → open，REDIS_BREAKER_RESET_SEC
+  內直接丟 CircuitOpenError（不碰網路）；之後 half-open 放一個探測指令，成功才 closed。
+  ResponseError（例如 NOSCRIPT、指令被停用）是 Redis 有回應，不算失敗。
+- Metrics：redis_command_duration_seconds{client,command}、redis_command_errors_total、
+  redis_breaker_state{client}（0 closed / 1 half-open / 2 open）。
+
+CircuitOpenError 繼承 redis ConnectionError，呼叫端以既有的 RedisError 處理即可。
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from prometheus_client import Counter, Gauge, Histogram
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.client import Pipeline
+from redis.asyncio.retry import Retry
+from redis.backoff import NoBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# ---- Metrics（由既有的 /metrics 匯出）----
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds",
+    "Redis command latency as seen by the app (pipelines are one observation)",
+    ["client", "command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+REDIS_COMMAND_ERRORS = Counter("redis_command_errors_total", "Redis commands failed", ["client", "error"])
+REDIS_BREAKER_STATE = Gauge("redis_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["client"])
+REDIS_BREAKER_TRANSITIONS = Counter("redis_breaker_transitions_total", "Circuit breaker state changes", ["client", "state"])
+
+
+class CircuitOpenError(RedisConnectionError):
+    """Breaker 打開中：指令沒有送出。"""
+
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    _GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = max(0.0, float(reset_timeout))
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        REDIS_BREAKER_STATE.labels(name).set(0)
+
+    def _transition(self, state: str) -> None:
+        if state != self.state:
+            logger.warning("Redis circuit breaker %s: %s -> %s", self.name, self.state, state)
+            self.state = state
+            REDIS_BREAKER_STATE.labels(self.name).set(self._GAUGE[state])
+            REDIS_BREAKER_TRANSITIONS.labels(self.name, state).inc()
+
+    def before_call(self) -> None:
+        """允許送出時直接返回；否則丟 CircuitOpenError。"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Redis circuit breaker '{self.name}' is open")
+            self._transition(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                raise CircuitOpenError(f"Redis circuit breaker '{self.name}' is probing")
+            self._probing = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self._probing = False
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._transition(self.OPEN)
+
+    def release_probe(self) -> None:
+        self._probing = False
+
+    def reset(self) -> None:
+        self.failures = 0
+        self._probing = False
+        self._transition(self.CLOSED)
+
+
+class _Guard:
+    """ResilientRedis 與 ResilientPipeline 共用：breaker + 指令 timeout + metrics。"""
+
+    def __init__(self, name: str, breaker: CircuitBreaker, command_timeout: Optional[float]):
+        self.name = name
+        self.breaker = breaker
+        self.command_timeout = command_timeout
+
+    async def call(self, command: str, fn: Callable[[], Awaitable[T]]) -> T:
+        self.breaker.before_call()
+        started = time.perf_counter()
+        try:
+            if self.command_timeout:
+                result = await asyncio.wait_for(fn(), self.command_timeout)
+            else:
+                result = await fn()
+        except asyncio.TimeoutError as e:
+            self.breaker.record_failure()
+            REDIS_COMMAND_ERRORS.labels(self.name, "timeout").inc()
+            raise RedisTimeoutError(f"Redis {command} timed out after {self.command_timeout}s") from e
+        except (RedisConnectionError, RedisTimeoutError, OSError) as e:
+            self.breaker.record_failure()
+            REDIS_COMMAND_ERRORS.labels(self.name, type(e).__name__).inc()
+            raise
+        except asyncio.CancelledError:
+            self.breaker.release_probe()  # 呼叫端取消，不算成功也不算失敗
+            raise
+        except Exception:
+            # ResponseError 等：Redis 有回應，連線是好的
+            self.breaker.record_success()
+            raise
+        else:
+            self.breaker.record_success()
+            return result
+        finally:
+            REDIS_COMMAND_DURATION.labels(self.name, command).observe(time.perf_counter() - started)
+
+
+class ResilientPipeline(Pipeline):
+    _guard: _Guard
+
+    async def execute(self, raise_on_error: bool = True):
+        command = "MULTI" if (self.is_transaction or self.explicit_transaction) else "PIPELINE"
+        return await self._guard.call(command, lambda: Pipeline.execute(self, raise_on_error))
+
+
+class ResilientRedis(Redis):
+    def __init__(self, *args: Any, guard: _Guard, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._guard = guard
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return self._guard.breaker
+
+    async def execute_command(self, *args: Any, **options: Any):
+        command = str(args[0]).upper() if args else "?"
+        return await self._guard.call(command, lambda: Redis.execute_command(self, *args, **options))
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> ResilientPipeline:
+        pipe = ResilientPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe._guard = self._guard
+        return pipe
+
+
+def create_redis(
+    url: Optional[str] = None,
+    name: str = "default",
+    connection_pool: Any = None,
+    **overrides: Any,
+) -> ResilientRedis:
+    """
+    建立帶 breaker 的 client；參數預設取自 settings.REDIS_*。
+    connection_pool 可替換成測試用的 fake（例如 fakeredis 的連線類別加上延遲）。
+    """
+    opts: Dict[str, Any] = {
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "pool_timeout": settings.REDIS_POOL_TIMEOUT_MS / 1000.0,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT_MS / 1000.0,
+        "connect_timeout": settings.REDIS_CONNECT_TIMEOUT_MS / 1000.0,
+        "command_timeout": settings.REDIS_COMMAND_TIMEOUT_MS / 1000.0,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_SEC,
+        "retries": settings.REDIS_RETRIES,
+        "breaker_failures": settings.REDIS_BREAKER_FAILURES,
+        "breaker_reset": settings.REDIS_BREAKER_RESET_SEC,
+    }
+    opts.update(overrides)
+
+    if connection_pool is None:
+        connection_pool = BlockingConnectionPool.from_url(
+            url or settings.REDIS_URL,
+            max_connections=int(opts["max_connections"]),
+            timeout=opts["pool_timeout"],
+            socket_timeout=opts["socket_timeout"],
+            socket_connect_timeout=opts["connect_timeout"],
+            health_check_interval=int(opts["health_check_interval"]),
+            retry=Retry(NoBackoff(), int(opts["retries"])),  # 重試交給 breaker，不在這裡疊加等待
+            encoding="utf-8",
+            decode_responses=True,
+        )
+    guard = _Guard(
+        name,
+        CircuitBreaker(name, opts["breaker_failures"], opts["breaker_reset"]),
+        opts["command_timeout"] or None,
+    )
+    return ResilientRedis(connection_pool=connection_pool, guard=guard)
+
+
+_clients: Dict[str, ResilientRedis] = {}
+
+
+def get_redis_client(name: str = "default") -> ResilientRedis:
+    """每個行程每個名稱一個 client（lazy-init；共用連線池與 breaker）。"""
+    client = _clients.get(name)
+    if client is None:
+        client = _clients[name] = create_redis(name=name)
+    return client
+
+
+async def close_redis_clients() -> None:
+    """lifespan 關閉時呼叫：關掉所有 client 與連線池。"""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+            await client.connection_pool.disconnect()
+        except Exception:
+            logger.debug("Redis client close failed", exc_info=True)
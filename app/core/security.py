@@ -1,21 +1,90 @@
 # app/core/security.py
+import hashlib
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, Optional, Tuple
 from uuid import uuid4
 
-from jose import jwt, JWTError
+from jose import JWTError
 from passlib.context import CryptContext
+from prometheus_client import Counter
 
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.jwt_backends import JWTBackend, get_backend, peek_claims, peek_header
+from app.core.keyring import Keyring, load_keyring
+from app.services.password_pool import password_pool
 
 # === Password Hashing ===
-pwd_context = CryptContext(
+_PWD_BASE_CONFIG: Dict[str, Any] = dict(
     schemes=["bcrypt"],
     deprecated="auto",
     bcrypt__ident="2b",
     # 若密碼超過 72 bytes，不拋錯（與現有流程相容）
     bcrypt__truncate_error=False,
 )
+pwd_context = CryptContext(**_PWD_BASE_CONFIG)
+
+# 自動校準時的範圍：低於 10 不安全，高於 15 在一般硬體上已是秒級
+BCRYPT_CALIBRATION_MIN_ROUNDS = 10
+BCRYPT_CALIBRATION_MAX_ROUNDS = 15
+
+def configure_password_hashing(rounds: Optional[int]) -> None:
+    """
+    設定 bcrypt work factor。rounds 固定時，cost 不同（較高或較低）的既有雜湊
+    都會被 password_needs_rehash 標記，於下次登入成功時重算。
+    rounds=None 則回到 passlib 預設且不強制重算。
+    """
+    config = dict(_PWD_BASE_CONFIG)
+    if rounds:
+        config.update(
+            bcrypt__default_rounds=int(rounds),
+            bcrypt__min_rounds=int(rounds),
+            bcrypt__max_rounds=int(rounds),
+        )
+    pwd_context.load(config)
+
+def current_bcrypt_rounds() -> int:
+    return int(pwd_context.handler("bcrypt").default_rounds)
+
+def _time_bcrypt(rounds: int, samples: int) -> float:
+    """回傳在 rounds 下單次 verify 的中位數耗時（秒）。"""
+    handler = pwd_context.handler("bcrypt").using(rounds=rounds)
+    sample_hash = handler.hash("calibration-password")
+    timings = []
+    for _ in range(max(1, samples)):
+        t0 = time.perf_counter()
+        handler.verify("calibration-password", sample_hash)
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+def calibrate_bcrypt_rounds(
+    target_ms: float,
+    min_rounds: int = BCRYPT_CALIBRATION_MIN_ROUNDS,
+    max_rounds: int = BCRYPT_CALIBRATION_MAX_ROUNDS,
+    samples: int = 3,
+) -> Tuple[int, Dict[int, float]]:
+    """
+    在本機量測 bcrypt，挑出 verify 時間不超過 target_ms 的最大 rounds。
+    每 +1 round 耗時約翻倍：先量 min_rounds 再外推，最後實測確認。
+    回傳 (rounds, {rounds: 實測毫秒})。
+    """
+    measured: Dict[int, float] = {}
+    base = _time_bcrypt(min_rounds, samples) * 1000
+    measured[min_rounds] = base
+
+    rounds = min_rounds
+    while rounds < max_rounds and base * (2 ** (rounds + 1 - min_rounds)) <= target_ms:
+        rounds += 1
+
+    while rounds > min_rounds:
+        if rounds not in measured:
+            measured[rounds] = _time_bcrypt(rounds, samples) * 1000
+        if measured[rounds] <= target_ms:
+            break
+        rounds -= 1
+    return rounds, measured
 
 def _sanitize_password(p: str) -> str:
     # bcrypt 只吃前 72 bytes，避免極長密碼在某些環境報錯
@@ -27,6 +96,20 @@ def hash_password(plain: str) -> str:
 def verify_password(plain: str, password_hash: str) -> bool:
     return pwd_context.verify(_sanitize_password(plain), password_hash)
 
+# async 版本：在 password_pool 執行，不阻塞 event loop；池滿時丟 PasswordHashBusy
+async def hash_password_async(plain: str) -> str:
+    return await password_pool.run("hash", hash_password, plain)
+
+async def verify_password_async(plain: str, password_hash: str) -> bool:
+    return await password_pool.run("verify", verify_password, plain, password_hash)
+
+def password_needs_rehash(password_hash: str) -> bool:
+    """雜湊的 cost / 演算法是否已不符目前設定（登入成功時透明升級）。"""
+    try:
+        return pwd_context.needs_update(password_hash)
+    except Exception:
+        return False
+
 # === JWT Helpers ===
 def _now_utc() -> datetime:
     return datetime.now(timezone.utc)
@@ -38,11 +121,30 @@ def _refresh_secret() -> str:
     # 若沒有設定 REFRESH_SECRET_KEY，會 fallback 至 SECRET_KEY（相容）
     return settings.REFRESH_SECRET_KEY or settings.SECRET_KEY
 
-def _encode(claims: Dict[str, Any], key: str) -> str:
-    return jwt.encode(claims, key, algorithm=settings.JWT_ALGORITHM)
+# 簽章後端與預先建好的 key 物件（避免每次呼叫都重新解析 secret）
+_jwt_backend: JWTBackend
+_access_key: Any
+_refresh_key: Any
+# Access token 的非對稱 keyring（ES256 / EdDSA）；refresh token 只有本服務驗證，維持 HS256
+_keyring: Keyring
+
+def configure_jwt_backend(name: Optional[str] = None) -> JWTBackend:
+    """選擇 JWT 後端（預設 settings.JWT_BACKEND），並重建 key 物件與 keyring。"""
+    global _jwt_backend, _access_key, _refresh_key, _keyring
+    backend = get_backend(name or settings.JWT_BACKEND)
+    _access_key = backend.load_key(settings.SECRET_KEY, settings.JWT_ALGORITHM)
+    _refresh_key = backend.load_key(_refresh_secret(), settings.JWT_ALGORITHM)
+    _keyring = load_keyring(settings.JWT_SIGNING_KEYS, settings.JWT_ACTIVE_KID, backend)
+    _jwt_backend = backend
+    return backend
+
+def _encode(claims: Dict[str, Any], key: Any) -> str:
+    return _jwt_backend.encode(claims, key, settings.JWT_ALGORITHM)
 
-def _decode(token: str, key: str) -> Dict[str, Any]:
-    return jwt.decode(token, key, algorithms=[settings.JWT_ALGORITHM])
+def _decode(token: str, key: Any) -> Dict[str, Any]:
+    return _jwt_backend.decode(token, key, settings.JWT_ALGORITHM)
+
+configure_jwt_backend()
 
 # === Issue Tokens ===
 def create_access_token(data: Dict[str, Any], expires_minutes: Optional[int] = None) -> str:
@@ -59,7 +161,11 @@ def create_access_token(data: Dict[str, Any], expires_minutes: Optional[int] = N
         "iat": int(_now_utc().timestamp()),
         "exp": _exp(expires_minutes or settings.ACCESS_TOKEN_EXPIRE_MINUTES),
     })
-    return _encode(to_encode, settings.SECRET_KEY)
+    active = _keyring.active
+    if active is not None:
+        # 非對稱簽章：header 帶 kid，下游可用 JWKS 在本地驗證
+        return _jwt_backend.encode(to_encode, active.key, active.alg, {"kid": active.kid})
+    return _encode(to_encode, _access_key)
 
 def create_refresh_token(data: Dict[str, Any], expires_minutes: Optional[int] = None) -> str:
     """
@@ -76,7 +182,7 @@ def create_refresh_token(data: Dict[str, Any], expires_minutes: Optional[int] =
         "iat": int(_now_utc().timestamp()),
         "exp": _exp(expires_minutes or settings.REFRESH_TOKEN_EXPIRE_MINUTES),
     })
-    return _encode(to_encode, _refresh_secret())
+    return _encode(to_encode, _refresh_key)
 
 def issue_token_pair(user_id: int, ver: int) -> Tuple[str, str]:
     """
@@ -86,21 +192,84 @@ def issue_token_pair(user_id: int, ver: int) -> Tuple[str, str]:
     base = {"sub": str(user_id), "ver": int(ver)}
     return create_access_token(base), create_refresh_token(base)
 
+# === Verified-claims cache ===
+# 同一支 access token 常被連續使用數十次：快取「已驗證」的 claims，
+# key 為 token 的 sha256，在 exp 時淘汰；總量以估算的 bytes 設上限。
+ACCESS_TOKEN_CACHE_REQUESTS = Counter(
+    "access_token_cache_requests_total",
+    "Verified access-token claims cache lookups",
+    ["result"],
+)
+
+_claims_cache: "TTLCache[bytes, Dict[str, Any]]" = TTLCache(
+    maxsize=settings.ACCESS_TOKEN_CACHE_MAX_ENTRIES,
+    ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    max_weight=settings.ACCESS_TOKEN_CACHE_MAX_BYTES,
+)
+
+# 每筆的粗估固定開銷（dict、digest、OrderedDict 節點）
+_CLAIMS_ENTRY_OVERHEAD = 512
+
+def clear_access_token_cache() -> None:
+    _claims_cache.clear()
+
 # === Verify / Decode ===
-def decode_access_token(token: str) -> Dict[str, Any]:
+def jwks() -> Dict[str, Any]:
+    """目前 keyring 的公開 JWK Set（/.well-known/jwks.json）。"""
+    return _keyring.jwks()
+
+def _verify_access_signature(token: str) -> Dict[str, Any]:
     """
-    驗證並解出 Access Token；若 token type 不為 access，會拋錯。
+    依 header 的 kid 選 key：
+      - kid 在 keyring → 以該 key 的演算法驗證
+      - 沒有 kid → 舊的 HS256（遷移期間 JWT_ACCEPT_HS256_ACCESS=1 或尚未啟用非對稱簽章時）
+      - 未知 kid → 拒絕
     """
-    payload = _decode(token, settings.SECRET_KEY)
+    kid = peek_header(token).get("kid")
+    entry = _keyring.get(kid)
+    if entry is not None:
+        return _jwt_backend.decode(token, entry.key, entry.alg)
+    if kid is None and (settings.JWT_ACCEPT_HS256_ACCESS or _keyring.active is None):
+        return _decode(token, _access_key)
+    raise JWTError("Unknown or disallowed signing key for access token.")
+
+def _decode_access_token_uncached(token: str) -> Dict[str, Any]:
+    payload = _verify_access_signature(token)
     if payload.get("type") != "access":
         raise JWTError("Invalid token type for this endpoint (need access token).")
     return payload
 
+def decode_access_token(token: str) -> Dict[str, Any]:
+    """
+    驗證並解出 Access Token；若 token type 不為 access，會拋錯。
+    驗證成功的結果會快取到 exp（ACCESS_TOKEN_CACHE_ENABLED=0 可關閉）。
+    """
+    if not settings.ACCESS_TOKEN_CACHE_ENABLED:
+        return _decode_access_token_uncached(token)
+
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    cached = _claims_cache.get(key)
+    if cached is not None:
+        ACCESS_TOKEN_CACHE_REQUESTS.labels("hit").inc()
+        return dict(cached)
+
+    ACCESS_TOKEN_CACHE_REQUESTS.labels("miss").inc()
+    payload = _decode_access_token_uncached(token)
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        _claims_cache.set(
+            key,
+            dict(payload),
+            ttl=exp - time.time(),
+            weight=len(token) + _CLAIMS_ENTRY_OVERHEAD,
+        )
+    return payload
+
 def decode_refresh_token(token: str) -> Dict[str, Any]:
     """
     驗證並解出 Refresh Token；若 token type 不為 refresh，會拋錯。
     """
-    payload = _decode(token, _refresh_secret())
+    payload = _decode(token, _refresh_key)
     if payload.get("type") != "refresh":
         raise JWTError("Invalid token type for refresh.")
     return payload
@@ -108,8 +277,18 @@ def decode_refresh_token(token: str) -> Dict[str, Any]:
 def try_decode_any(token: str) -> Dict[str, Any]:
     """
     工具函式：嘗試用 access/refresh 兩把 key 都解（診斷/除錯用）。
+    先依未驗證的 type 挑 key，避免大多數情況下驗兩次。
     """
     try:
-        return _decode(token, settings.SECRET_KEY)
+        typ = peek_claims(token).get("type")
+    except Exception:
+        typ = None
+    if typ == "refresh":
+        try:
+            return _decode(token, _refresh_key)
+        except Exception:
+            return _verify_access_signature(token)
+    try:
+        return _verify_access_signature(token)
     except Exception:
-        return _decode(token, _refresh_secret())
+        return _decode(token, _refresh_key)
@@ -0,0 +1,143 @@
+# app/db/pool.py
+"""
+DB 連線池設定與監控：
+- engine_options()：由 settings.DB_POOL_* / DB_* 組出 create_async_engine 的參數
+  （pool 大小 / overflow / timeout / recycle、pre-ping 策略、asyncpg 的 statement cache 等）。
+- InstrumentedQueuePool：計時每次 checkout 的等待（含池滿時排隊與建立新連線），
+  並計算 checkout timeout 次數；checked-out / overflow / idle 以 gauge 即時回報。
+- pre-ping 策略：always = 每次 checkout 都 ping（SQLAlchemy pool_pre_ping）；
+  idle = 只有閒置超過 DB_POOL_PRE_PING_IDLE_SEC 的連線才 ping；off = 不 ping（靠 pool_recycle）。
+
+每個 worker 的連線上限 = DB_POOL_SIZE + DB_MAX_OVERFLOW；總數 × worker 數不可超過 DB 的 max_connections。
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Dict
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PRE_PING_STRATEGIES = ("always", "idle", "off")
+
+# ---- Metrics（由既有的 /metrics 匯出）----
+DB_POOL_SIZE = Gauge("db_pool_size", "Configured pool size (persistent connections)", ["pool"])
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out", ["pool"])
+DB_POOL_IDLE = Gauge("db_pool_idle", "Idle connections in the pool", ["pool"])
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond pool_size (negative = unused slots)", ["pool"])
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time to obtain a connection from the pool (queueing + new connection setup)",
+    ["pool"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+DB_POOL_TIMEOUTS = Counter("db_pool_checkout_timeouts_total", "Checkouts that gave up after pool_timeout", ["pool"])
+DB_POOL_PINGS = Counter("db_pool_pre_ping_total", "Pre-ping round trips on checkout, by result", ["pool", "result"])
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool + checkout 等待時間 / timeout 計數。"""
+
+    metrics_name: str = "primary"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            DB_POOL_TIMEOUTS.labels(self.metrics_name).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(self.metrics_name).observe(time.perf_counter() - started)
+
+
+def pool_class(name: str) -> type:
+    """每個 engine 一個子類別，metrics 以 name 區分（primary / replica 等）。"""
+    return type(f"InstrumentedQueuePool_{name}", (InstrumentedQueuePool,), {"metrics_name": name})
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def engine_options(url: str, name: str = "primary") -> Dict[str, Any]:
+    """create_async_engine 的 kwargs（echo 之外）；sqlite 不套 asyncpg 參數，:memory: 維持預設的單一連線池。"""
+    strategy = settings.DB_POOL_PRE_PING.lower()
+    if strategy not in PRE_PING_STRATEGIES:
+        raise ValueError(f"DB_POOL_PRE_PING must be one of {PRE_PING_STRATEGIES}, got {strategy!r}")
+
+    opts: Dict[str, Any] = {"pool_pre_ping": strategy == "always"}
+    parsed = make_url(url)
+    if _is_sqlite(url) and parsed.database in (None, "", ":memory:"):
+        return opts
+
+    opts.update(
+        poolclass=pool_class(name),
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    if parsed.get_driver_name() == "asyncpg":
+        connect_args: Dict[str, Any] = {
+            # asyncpg 本身的 statement cache；經 pgbouncer（transaction mode）時要設 0
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            # SQLAlchemy asyncpg 轉接層的 prepared statement cache
+            "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+            "server_settings": {"application_name": settings.DB_APPLICATION_NAME},
+        }
+        if settings.DB_COMMAND_TIMEOUT:
+            connect_args["command_timeout"] = settings.DB_COMMAND_TIMEOUT
+        opts["connect_args"] = connect_args
+    return opts
+
+
+def _install_idle_pre_ping(engine: AsyncEngine, name: str, idle_sec: float) -> None:
+    """閒置超過 idle_sec 的連線在 checkout 時先 ping；失敗時丟 DisconnectionError 讓池換一條新連線。"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        last = connection_record.info.get("checked_in_at")
+        if last is None or time.monotonic() - last < idle_sec:
+            return
+        try:
+            sync_engine.dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            DB_POOL_PINGS.labels(name, "stale").inc()
+            raise sa_exc.DisconnectionError("stale pooled connection") from e
+        DB_POOL_PINGS.labels(name, "ok").inc()
+
+
+def instrument_engine(engine: AsyncEngine, name: str = "primary") -> None:
+    """註冊 pool gauges（即時讀取 pool 狀態）與 idle pre-ping。"""
+    pool = engine.sync_engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        DB_POOL_SIZE.labels(name).set(pool.size())
+        DB_POOL_CHECKED_OUT.labels(name).set_function(pool.checkedout)
+        DB_POOL_IDLE.labels(name).set_function(pool.checkedin)
+        DB_POOL_OVERFLOW.labels(name).set_function(pool.overflow)
+    if settings.DB_POOL_PRE_PING.lower() == "idle":
+        _install_idle_pre_ping(engine, name, settings.DB_POOL_PRE_PING_IDLE_SEC)
+    logger.info(
+        "DB pool configured",
+        extra={
+            "pool": name,
+            "pool_class": type(pool).__name__,
+            "size": getattr(pool, "size", lambda: None)(),
+            "pre_ping": settings.DB_POOL_PRE_PING,
+        },
+    )
@@ -1,12 +1,13 @@
 # app/main.py
 import logging
 import os
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
 from app.core.logging import setup_logging
 from app.core.errors import register_error_handlers
+from app.core.security import calibrate_bcrypt_rounds, configure_password_hashing, jwks
 from app.api.v1.router import api_router
 from app.services.scheduler import lifespan_scheduler  # lifespan（排程）
 
@@ -39,9 +40,26 @@ def _validate_secrets() -> None:
             )
 
 
+def _configure_password_hashing() -> None:
+    """
+    決定 bcrypt cost：PASSWORD_HASH_CALIBRATE 時依本機效能校準，
+    否則使用 BCRYPT_ROUNDS（未設定則維持 passlib 預設）。
+    """
+    rounds = settings.BCRYPT_ROUNDS
+    if settings.PASSWORD_HASH_CALIBRATE:
+        rounds, measured = calibrate_bcrypt_rounds(settings.PASSWORD_HASH_TARGET_MS)
+        log.info(
+            "bcrypt calibrated",
+            extra={"rounds": rounds, "target_ms": settings.PASSWORD_HASH_TARGET_MS, "measured_ms": measured},
+        )
+    if rounds:
+        configure_password_hashing(rounds)
+
+
 def create_app() -> FastAPI:
     # 基本安全檢查
     _validate_secrets()
+    _configure_password_hashing()
 
     # 啟用 lifespan（內含 APScheduler：黑名單清理排程）
     app = FastAPI(
@@ -94,6 +112,12 @@ def create_app() -> FastAPI:
         # TODO: 可在此加入 DB/Redis 探針
         return {"ready": True}
 
+    # Access token 公鑰（ES256 / EdDSA）；gateway / sidecar 可快取後在本地驗證
+    @app.get("/.well-known/jwks.json", tags=["auth"], include_in_schema=False)
+    async def jwks_document(response: Response):
+        response.headers["Cache-Control"] = f"public, max-age={settings.JWKS_CACHE_MAX_AGE}"
+        return jwks()
+
     log.info("Application initialized", extra={"env": settings.ENV})
     return app
 
@@ -0,0 +1,36 @@
+# app/models/refresh_session.py
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, Integer, DateTime, ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from app.models.base import Base
+
+
+class RefreshSession(Base):
+    """
+    Refresh token family：每次登入一列，refresh token 帶 (fam, gen)。
+    輪替時 generation + 1（條件式 UPDATE）；拿舊 generation 來換 = 重放 → 整個 family 撤銷。
+    """
+    __tablename__ = "refresh_sessions"
+
+    # family id（uuid4 hex），即 refresh token 的 fam claim
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    # 目前有效的 refresh token 世代；只會遞增
+    generation: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    # 裝置資訊（「我的裝置」列表用）
+    user_agent: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    ip: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    # 最新一支 refresh token 的 exp；過期後可清除
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    revoked_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # logout / logout_all / replay / user_revoke
+    revoked_reason: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+
+    __table_args__ = (
+        Index("ix_refresh_sessions_user_id_revoked_at", "user_id", "revoked_at"),
+    )
@@ -18,8 +18,8 @@ class TokenBlacklist(Base):
     # 黑名單原因（例如 logout / logout_all / admin_revoke）
     reason: Mapped[str] = mapped_column(String(255), nullable=True)
 
-    # 到期時間（用來定期清理過期黑名單）
-    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    # 到期時間（用來定期清理過期黑名單；有索引供分批清理使用）
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
     __table_args__ = (
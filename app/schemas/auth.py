@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import Optional
+
 from pydantic import BaseModel
 
 class Token(BaseModel):
@@ -9,3 +12,16 @@ class TokenPair(Token):
 
 class RefreshRequest(BaseModel):
     refresh_token: str
+
+class SessionRead(BaseModel):
+    """一個登入 session（refresh family），「我的裝置」列表用"""
+    id: str
+    user_agent: Optional[str] = None
+    ip: Optional[str] = None
+    created_at: datetime
+    last_used_at: datetime
+    expires_at: datetime
+    current: bool = False
+
+    class Config:
+        from_attributes = True
@@ -1,14 +1,144 @@
-# app/services/blacklist_cleanup.py
+"""
+token_blacklist（以及 refresh_sessions）過期列的分批清理：
+- 每批依 expires_at 索引找出最多 batch_size 個過期列的主鍵，再以 DELETE ... WHERE id IN (...) 刪除並 commit，
+  每個 transaction 都很短，不會長時間持有鎖或撐大 WAL。
+- 批次之間 sleep，讓登入 / 登出的寫入有空檔；超過 max_runtime 就停止，剩下的留給下一次排程。
+- dry_run 只掃描不刪除；blacklist_stats() 給 scripts/run_cleanup_once.py --stats 使用。
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from sqlalchemy import delete
+from typing import Any, Dict, List, Optional, Type
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import delete, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
+from app.models.refresh_session import RefreshSession
 from app.models.token_blacklist import TokenBlacklist
 
+# ---- Metrics（由既有的 /metrics 匯出）----
+PURGE_ROWS = Counter("blacklist_purge_rows_total", "Expired rows deleted by the purge engine", ["table"])
+PURGE_BATCHES = Counter("blacklist_purge_batches_total", "Purge batches committed", ["table"])
+PURGE_DURATION = Histogram(
+    "blacklist_purge_duration_seconds",
+    "Wall time of one purge run (including throttling sleeps)",
+    ["table"],
+)
+PURGE_ROWS_PER_SEC = Gauge("blacklist_purge_rows_per_second", "Delete rate of the last purge run", ["table"])
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)  # DB 多半是 naive UTC
+
+
+@dataclass
+class PurgeStats:
+    deleted: int = 0  # dry_run 時為「會被刪除」的列數
+    batches: int = 0
+    elapsed: float = 0.0
+    complete: bool = True  # False = 因 max_runtime 提前停止
+    dry_run: bool = False
+    batch_sizes: List[int] = field(default_factory=list)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.deleted / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "deleted": self.deleted,
+            "batches": self.batches,
+            "elapsed_sec": round(self.elapsed, 3),
+            "rows_per_sec": round(self.rows_per_sec, 1),
+            "complete": self.complete,
+            "dry_run": self.dry_run,
+        }
+
+
+async def purge_expired_rows(
+    db: AsyncSession,
+    model: Type[Any],
+    batch_size: Optional[int] = None,
+    sleep_sec: Optional[float] = None,
+    max_runtime_sec: Optional[float] = None,
+    dry_run: bool = False,
+    now: Optional[datetime] = None,
+) -> PurgeStats:
+    """分批刪除 model 中 expires_at < now 的列（model 需有 id 主鍵與 expires_at）；參數預設取自 settings.BLACKLIST_PURGE_*。"""
+    batch_size = max(1, int(batch_size or settings.BLACKLIST_PURGE_BATCH_SIZE))
+    sleep_sec = settings.BLACKLIST_PURGE_SLEEP_SEC if sleep_sec is None else sleep_sec
+    max_runtime_sec = settings.BLACKLIST_PURGE_MAX_RUNTIME_SEC if max_runtime_sec is None else max_runtime_sec
+    now = now or _utcnow()
+
+    table = model.__tablename__
+    stats = PurgeStats(dry_run=dry_run)
+    started = time.monotonic()
+    last_id: Any = None
+    while True:
+        # 依主鍵遞增前進：dry_run 不刪除也不會重複掃到同一批
+        q = select(model.id).where(model.expires_at < now)
+        if last_id is not None:
+            q = q.where(model.id > last_id)
+        ids = (await db.execute(q.order_by(model.id).limit(batch_size))).scalars().all()
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        if not dry_run:
+            await db.execute(delete(model).where(model.id.in_(ids)))
+            await db.commit()
+            PURGE_ROWS.labels(table).inc(len(ids))
+            PURGE_BATCHES.labels(table).inc()
+        else:
+            await db.rollback()  # 結束唯讀 transaction，不佔住 snapshot
+        stats.deleted += len(ids)
+        stats.batches += 1
+        stats.batch_sizes.append(len(ids))
+
+        if len(ids) < batch_size:
+            break
+        if time.monotonic() - started >= max_runtime_sec:
+            stats.complete = False
+            break
+        if sleep_sec > 0:
+            await asyncio.sleep(sleep_sec)
+
+    stats.elapsed = time.monotonic() - started
+    if not dry_run:
+        PURGE_DURATION.labels(table).observe(stats.elapsed)
+        PURGE_ROWS_PER_SEC.labels(table).set(stats.rows_per_sec)
+    return stats
+
+
+async def purge_expired_blacklist(db: AsyncSession, **kwargs: Any) -> PurgeStats:
+    return await purge_expired_rows(db, TokenBlacklist, **kwargs)
+
+
+async def purge_expired_sessions(db: AsyncSession, **kwargs: Any) -> PurgeStats:
+    """refresh family 在最後一支 refresh token 過期後即可刪除（含已撤銷的）。"""
+    return await purge_expired_rows(db, RefreshSession, **kwargs)
+
+
+async def blacklist_stats(db: AsyncSession, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """token_blacklist 的概況：總列數、已過期列數、最舊的過期時間。"""
+    now = now or _utcnow()
+    total = (await db.execute(select(func.count(TokenBlacklist.id)))).scalar() or 0
+    expired, oldest = (await db.execute(
+        select(func.count(TokenBlacklist.id), func.min(TokenBlacklist.expires_at))
+        .where(TokenBlacklist.expires_at < now)
+    )).one()
+    return {
+        "total": int(total),
+        "expired": int(expired or 0),
+        "live": int(total) - int(expired or 0),
+        "oldest_expired_at": oldest.isoformat() if oldest else None,
+    }
+
+
 async def cleanup_expired_blacklist(db: AsyncSession) -> int:
-    """刪除已過期的黑名單，回傳刪除數量。"""
-    now = datetime.now(timezone.utc).replace(tzinfo=None)  # DB 多半是 naive UTC
-    stmt = delete(TokenBlacklist).where(TokenBlacklist.expires_at < now)
-    res = await db.execute(stmt)
-    await db.commit()
-    return res.rowcount or 0
\ No newline at end of file
+    """刪除已過期的黑名單，回傳刪除數量（排程使用，參數取自 settings）。"""
+    stats = await purge_expired_blacklist(db)
+    return stats.deleted
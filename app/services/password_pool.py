@@ -0,0 +1,108 @@
+# app/services/password_pool.py
+"""
+密碼雜湊專用的執行緒池：
+- bcrypt 每次約 200ms+ 且是 CPU 密集；直接在 async handler 內呼叫會卡住整個 event loop。
+- bcrypt 計算時會釋放 GIL，所以用 thread pool 就能平行，不需要 process pool。
+- 同時在跑 + 排隊中的工作數有上限；超過時丟 PasswordHashBusy，由 errors.py 轉成 503 + Retry-After。
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from prometheus_client import Counter, Histogram
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HASH_QUEUE_WAIT = Histogram(
+    "password_hash_queue_wait_seconds",
+    "Time a password hash/verify job waited for a pool thread",
+    ["op"],
+    buckets=_BUCKETS,
+)
+HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "Time spent computing a password hash/verify",
+    ["op"],
+    buckets=_BUCKETS,
+)
+HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Password hash/verify jobs shed because the pool queue was full",
+    ["op"],
+)
+
+
+class PasswordHashBusy(Exception):
+    """雜湊池已滿；呼叫端應回 503 並帶 Retry-After。"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Password hashing capacity exhausted")
+        self.retry_after = retry_after
+
+
+class PasswordHashPool:
+    def __init__(self, workers: int, max_queue: int, retry_after: int = 1):
+        self.workers = max(1, int(workers))
+        self.max_queue = max(0, int(max_queue))
+        self.retry_after = max(1, int(retry_after))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="pwd-hash",
+            )
+        return self._executor
+
+    async def run(self, op: str, fn: Callable[..., T], *args) -> T:
+        """在池中執行 fn(*args)；池滿時立即丟 PasswordHashBusy（不排隊等待）。"""
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                HASH_REJECTED.labels(op).inc()
+                raise PasswordHashBusy(self.retry_after)
+            self._pending += 1
+
+        enqueued = time.perf_counter()
+
+        def _job() -> T:
+            started = time.perf_counter()
+            HASH_QUEUE_WAIT.labels(op).observe(started - enqueued)
+            try:
+                return fn(*args)
+            finally:
+                HASH_DURATION.labels(op).observe(time.perf_counter() - started)
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), _job)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_pool = PasswordHashPool(
+    workers=settings.PASSWORD_HASH_WORKERS or min(4, os.cpu_count() or 1),
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    retry_after=settings.PASSWORD_HASH_RETRY_AFTER_SEC,
+)
@@ -1,18 +1,42 @@
 # app/services/rate_limit.py
 from __future__ import annotations
 
+import logging
+import math
 import os
 import time
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
+from uuid import uuid4
 
+from prometheus_client import Counter
 from redis.asyncio import Redis
+from redis.commands.core import AsyncScript
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import ResponseError, WatchError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+from app.core.cache import TTLCache
 from app.core.config import settings as _settings
+from app.core.redis_client import get_redis_client
+from app.services.rate_limit_hybrid import HybridLimiter
+
+logger = logging.getLogger(__name__)
 
 # ---- 參數（帶防呆預設）----
-REDIS_URL: str = getattr(_settings, "REDIS_URL", "redis://localhost:6379/0")
 WINDOW_SEC: int = int(getattr(_settings, "RATE_LIMIT_WINDOW_SEC", 600))
 MAX_PER_IP: int = int(getattr(_settings, "RATE_LIMIT_MAX_PER_IP", 200))
 MAX_PER_EMAIL_IP: int = int(getattr(_settings, "RATE_LIMIT_MAX_PER_EMAIL_IP", 50))
+# sliding_window：每次嘗試一個 sorted-set 成員（精確視窗）；gcra：每個 key 只存一個 TAT 值（O(1) 記憶體）
+# hybrid：本地近似計數 + 週期同步（見 rate_limit_hybrid.py），只有接近門檻時才同步問 Redis
+ALGORITHM: str = str(getattr(_settings, "RATE_LIMIT_ALGORITHM", "sliding_window")).lower()
+# Redis 不可用（breaker open / 連線錯誤 / 逾時）時：open = 直接放行；local = 改用本 worker 的限流
+FAILOVER_MODES = ("open", "local")
+LOGIN_FAILOVER: str = str(getattr(_settings, "RATE_LIMIT_LOGIN_FAILOVER", "local")).lower()
+
+RATE_LIMIT_FAILOVER = Counter(
+    "rate_limit_failover_total",
+    "Limiter decisions made without Redis (breaker open / Redis error), by policy and failover mode",
+    ["policy", "mode"],
+)
 
 # ---- 開關：可由 env 或 settings 控制；pytest 自動停用 ----
 def _is_pytest() -> bool:
@@ -29,19 +53,12 @@ def _enabled() -> bool:
     # 測試時一律停用；否則看總開關
     return _RATE_LIMIT_ENABLED and not _DISABLE_FOR_TEST
 
-# 單例 Redis（lazy-init）
-_redis: Optional[Redis] = None
-
 def _get_redis() -> Redis:
-    """Lazy 初始化 Redis 連線。只有在限流啟用時才會被呼叫。"""
-    global _redis
-    if _redis is None:
-        _redis = Redis.from_url(
-            REDIS_URL,
-            encoding="utf-8",
-            decode_responses=True,
-        )
-    return _redis
+    """共用的 Redis client（連線池 / timeout / circuit breaker，見 app/core/redis_client.py）。只有在限流啟用時才會被呼叫。"""
+    return get_redis_client()
+
+async def get_redis() -> Redis:
+    return _get_redis()
 
 def _key_ip(ip: str) -> str:
     return f"rl:login:ip:{ip or 'unknown'}"
@@ -49,58 +66,346 @@ def _key_ip(ip: str) -> str:
 def _key_email_ip(email: str, ip: str) -> str:
     return f"rl:login:ei:{(email or '').lower()}|{ip or 'unknown'}"
 
-async def _prune(redis: Redis, key: str, now_s: float) -> None:
-    await redis.zremrangebyscore(key, "-inf", now_s - WINDOW_SEC)
+# ---- Sliding window：所有維度的判斷 + 記錄在 Redis 端一次完成 ----
+# KEYS = 各維度的 key；ARGV = now, window, member, cost, limit_1, limit_2, ...
+# 任一維度放不下 cost → 不記錄，回傳 {0, retry_after, remaining}；
+# 否則每個 key 各記 cost 個成員並設定 TTL，回傳 {1, 0, remaining}（remaining 取各維度最小值）
+SLIDING_WINDOW_LUA = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local member = ARGV[3]
+local cost = tonumber(ARGV[4])
+local retry = 0
+local room = nil
+for i, key in ipairs(KEYS) do
+  local limit = tonumber(ARGV[4 + i])
+  redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+  local count = redis.call('ZCARD', key)
+  if count + cost > limit then
+    -- 要等到第 (count + cost - limit) 舊的成員滑出視窗才放得下
+    local nth = count + cost - limit - 1
+    local entry = redis.call('ZRANGE', key, nth, nth, 'WITHSCORES')
+    local wait = window
+    if entry[2] then
+      wait = math.floor(window - (now - tonumber(entry[2])))
+    end
+    retry = math.max(retry, wait, 1)
+  end
+  if room == nil or limit - count < room then
+    room = limit - count
+  end
+end
+if retry > 0 then
+  return {0, retry, math.max(room, 0)}
+end
+for _, key in ipairs(KEYS) do
+  for j = 1, cost do
+    redis.call('ZADD', key, now, member .. ':' .. j)
+  end
+  redis.call('EXPIRE', key, math.ceil(window))
+end
+return {1, 0, room - cost}
+"""
+
+# Redis 端不支援 script（例如部分代管 / proxy 停用 EVAL）時改走 pipeline
+_scripting_available: bool = True
+_sliding_window_lua: Optional[AsyncScript] = None
+
+def _member(now_s: float) -> str:
+    # 同一毫秒的多次嘗試也要是不同成員，否則 ZADD 會互相覆蓋而少算
+    return f"{now_s:.6f}:{uuid4().hex[:12]}"
+
+def _retry_after(now_s: float, oldest: Optional[float], window: Optional[float] = None) -> int:
+    window = WINDOW_SEC if window is None else window
+    return max(1, int(window - (now_s - (oldest if oldest is not None else now_s))))
+
+async def _sliding_window_script(
+    redis: Redis, dims: List[Tuple[str, int]], now_s: float, window: Optional[int] = None, cost: int = 1
+) -> Tuple[bool, int, int]:
+    global _sliding_window_lua
+    if _sliding_window_lua is None:
+        _sliding_window_lua = redis.register_script(SLIDING_WINDOW_LUA)
+    # evalsha；Redis 端沒有快取（NOSCRIPT）時自動改用 eval 並載入
+    allowed, retry_after, remaining = await _sliding_window_lua(
+        keys=[k for k, _ in dims],
+        args=[now_s, WINDOW_SEC if window is None else window, _member(now_s), cost, *[limit for _, limit in dims]],
+        client=redis,
+    )
+    return bool(int(allowed)), int(retry_after), int(remaining)
+
+async def _sliding_window_pipeline(
+    redis: Redis, dims: List[Tuple[str, int]], now_s: float, window: Optional[int] = None, cost: int = 1
+) -> Tuple[bool, int, int]:
+    """
+    無 script 時的後備：MULTI 一次讀出所有維度，再 MULTI 一次記錄（共 2 個 round trip）。
+    兩次之間的並行請求可能多放行幾個，但不會少算。
+    """
+    window = WINDOW_SEC if window is None else window
+    async with redis.pipeline(transaction=True) as pipe:
+        for key, _ in dims:
+            pipe.zremrangebyscore(key, "-inf", now_s - window)
+            pipe.zcard(key)
+            pipe.zrange(key, 0, cost - 1, withscores=True)
+        res = await pipe.execute()
+
+    retry_after, room = 0, None
+    for i, (_, limit) in enumerate(dims):
+        count, oldest = int(res[3 * i + 1]), res[3 * i + 2]
+        room = limit - count if room is None else min(room, limit - count)
+        if count + cost > limit:
+            nth = count + cost - limit - 1
+            retry_after = max(retry_after, _retry_after(now_s, float(oldest[nth][1]) if nth < len(oldest) else None, window))
+    if retry_after:
+        return False, retry_after, max(room, 0)
+
+    member = _member(now_s)
+    async with redis.pipeline(transaction=True) as pipe:
+        for key, _ in dims:
+            pipe.zadd(key, {f"{member}:{j}": now_s for j in range(1, cost + 1)})
+            pipe.expire(key, int(window))
+        await pipe.execute()
+    return True, 0, room - cost
+
+async def _sliding_window(
+    redis: Redis, dims: List[Tuple[str, int]], now_s: float, window: Optional[int] = None, cost: int = 1
+) -> Tuple[bool, int, int]:
+    global _scripting_available
+    if _scripting_available:
+        try:
+            return await _sliding_window_script(redis, dims, now_s, window, cost)
+        except ResponseError as e:
+            # 指令被停用 / 不支援；連線錯誤等其它例外照常往上丟
+            _scripting_available = False
+            logger.warning("Redis scripting unavailable, falling back to pipelined rate limiter: %s", e)
+    return await _sliding_window_pipeline(redis, dims, now_s, window, cost)
+
+# ---- GCRA（generic cell rate algorithm）：每個 key 只存「理論到達時間」TAT ----
+# limit 次 / window 秒 → 每 window/limit 秒補一格，最多可連續 limit 次（burst）；cost 次請求佔 cost 格。
+# 長期速率與 sliding window 相同；但任一 window 內最多可能放行 2*limit-1 次（burst 之後持續補格）。
+# KEYS = 各維度的 TAT key；ARGV = now, window, cost, limit_1, limit_2, ...
+GCRA_LUA = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local retry = 0
+local remaining = nil
+local new_tats = {}
+for i, key in ipairs(KEYS) do
+  local interval = window / tonumber(ARGV[3 + i])
+  local tat = tonumber(redis.call('GET', key) or now)
+  if tat < now then
+    tat = now
+  end
+  local new_tat = tat + interval * cost
+  local allow_at = new_tat - window
+  local left
+  if now < allow_at then
+    retry = math.max(retry, allow_at - now)
+    left = math.floor((window - (tat - now)) / interval + 1e-9)
+  else
+    left = math.floor((window - (new_tat - now)) / interval + 1e-9)
+  end
+  if remaining == nil or left < remaining then
+    remaining = left
+  end
+  new_tats[i] = new_tat
+end
+if retry > 0 then
+  return {0, tostring(retry), math.max(remaining, 0)}
+end
+for i, key in ipairs(KEYS) do
+  redis.call('SET', key, tostring(new_tats[i]), 'PX', math.ceil((new_tats[i] - now) * 1000))
+end
+return {1, '0', remaining}
+"""
+
+_gcra_lua: Optional[AsyncScript] = None
+
+def gcra_decide(
+    tat: Optional[float], now: float, window: float, limit: int, cost: int = 1
+) -> Tuple[bool, float, float]:
+    """
+    GCRA 的單一維度判斷（與 GCRA_LUA 相同的運算）。
+    回傳 (allowed, retry_after 秒, 新的 TAT)；拒絕時 TAT 不變。
+    """
+    interval = window / limit
+    tat = max(tat if tat is not None else now, now)
+    new_tat = tat + interval * cost
+    allow_at = new_tat - window
+    if now < allow_at:
+        return False, allow_at - now, tat
+    return True, 0.0, new_tat
+
+def gcra_remaining(tat: float, now: float, window: float, limit: int) -> int:
+    """TAT 為 tat 時還能立即放行的格數。"""
+    interval = window / limit
+    return max(0, math.floor((window - (max(tat, now) - now)) / interval + 1e-9))
 
-async def _count(redis: Redis, key: str) -> int:
-    return int(await redis.zcard(key))
+def _tat_key(key: str) -> str:
+    # 與 sliding window 的 sorted set 分開，切換演算法時不會 WRONGTYPE
+    return f"{key}:tat"
 
-async def _oldest_ts(redis: Redis, key: str) -> Optional[float]:
-    data = await redis.zrange(key, 0, 0, withscores=True)
-    if data:
-        return float(data[0][1])
-    return None
+def _retry_seconds(retry: float) -> int:
+    return max(1, math.ceil(retry))
 
-async def _hit(redis: Redis, key: str, now_s: float) -> None:
-    member = f"{now_s:.3f}"
-    await redis.zadd(key, {member: now_s})
+async def _gcra_script(
+    redis: Redis, dims: List[Tuple[str, int]], now_s: float, window: Optional[int] = None, cost: int = 1
+) -> Tuple[bool, int, int]:
+    global _gcra_lua
+    if _gcra_lua is None:
+        _gcra_lua = redis.register_script(GCRA_LUA)
+    allowed, retry, remaining = await _gcra_lua(
+        keys=[_tat_key(k) for k, _ in dims],
+        args=[now_s, WINDOW_SEC if window is None else window, cost, *[limit for _, limit in dims]],
+        client=redis,
+    )
+    if int(allowed):
+        return True, 0, int(remaining)
+    return False, _retry_seconds(float(retry)), int(remaining)
+
+async def _gcra_watch(
+    redis: Redis, dims: List[Tuple[str, int]], now_s: float, window: Optional[int] = None, cost: int = 1
+) -> Tuple[bool, int, int]:
+    """無 script 時的後備：WATCH + MULTI 樂觀交易，衝突時重試（仍是原子的）。"""
+    window = WINDOW_SEC if window is None else window
+    keys = [_tat_key(k) for k, _ in dims]
+    async with redis.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                await pipe.watch(*keys)
+                tats = await pipe.mget(keys)
+                retry, new_tats, remaining = 0.0, [], None
+                for raw, (_, limit) in zip(tats, dims):
+                    ok, wait, new_tat = gcra_decide(float(raw) if raw is not None else None, now_s, window, limit, cost)
+                    if not ok:
+                        retry = max(retry, wait)
+                    new_tats.append(new_tat)
+                    left = gcra_remaining(new_tat, now_s, window, limit)
+                    remaining = left if remaining is None else min(remaining, left)
+                if retry > 0:
+                    await pipe.unwatch()
+                    return False, _retry_seconds(retry), remaining
+                pipe.multi()
+                for key, new_tat in zip(keys, new_tats):
+                    pipe.set(key, repr(new_tat), px=math.ceil((new_tat - now_s) * 1000))
+                await pipe.execute()
+                return True, 0, remaining
+            except WatchError:
+                continue
+
+async def _gcra(
+    redis: Redis, dims: List[Tuple[str, int]], now_s: float, window: Optional[int] = None, cost: int = 1
+) -> Tuple[bool, int, int]:
+    global _scripting_available
+    if _scripting_available:
+        try:
+            return await _gcra_script(redis, dims, now_s, window, cost)
+        except ResponseError as e:
+            _scripting_available = False
+            logger.warning("Redis scripting unavailable, falling back to WATCH/MULTI rate limiter: %s", e)
+    return await _gcra_watch(redis, dims, now_s, window, cost)
+
+# ---- Redis 不可用時的本地後備：每個 worker 各自跑 GCRA（每個 key 一個 TAT，LRU 上限） ----
+# 全域上限變成約 workers × limit，但仍擋得住單一 client 的暴力嘗試
+class LocalLimiter:
+    def __init__(self, max_keys: int):
+        self._tats: TTLCache[str, float] = TTLCache(maxsize=max_keys, ttl=WINDOW_SEC)
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+    def hit(self, dims: List[Tuple[str, int]], now_s: float, window: float, cost: int = 1) -> Tuple[bool, int, int]:
+        retry, remaining, new_tats = 0.0, None, []
+        for key, limit in dims:
+            ok, wait, new_tat = gcra_decide(self._tats.get(key), now_s, window, limit, cost)
+            if not ok:
+                retry = max(retry, wait)
+            new_tats.append(new_tat)
+            left = gcra_remaining(new_tat, now_s, window, limit)
+            remaining = left if remaining is None else min(remaining, left)
+        if retry > 0:
+            return False, _retry_seconds(retry), remaining or 0
+        for (key, _), new_tat in zip(dims, new_tats):
+            self._tats.set(key, new_tat, ttl=new_tat - now_s)
+        return True, 0, remaining or 0
+
+    def forget(self, key: str) -> None:
+        self._tats.pop(key)
+
+local_limiter = LocalLimiter(max_keys=int(getattr(_settings, "RATE_LIMIT_LOCAL_MAX_KEYS", 100_000)))
+
+# ---- Hybrid：明確的情況由本 worker 的計數回答，接近門檻才走上面的 sliding window ----
+# 每個 worker 一份；背景同步由 lifespan 啟動（沒啟動時在請求中順便同步）
+hybrid_limiter = HybridLimiter(
+    sync_interval=float(getattr(_settings, "RATE_LIMIT_HYBRID_SYNC_MS", 250)) / 1000.0,
+    error=float(getattr(_settings, "RATE_LIMIT_HYBRID_ERROR", 0.1)),
+)
+
+async def _hybrid(
+    redis: Redis, dims: List[Tuple[str, int]], now_s: float, window: Optional[int] = None, cost: int = 1
+) -> Tuple[bool, int, int]:
+    return await hybrid_limiter.check(
+        redis, dims, now_s, WINDOW_SEC if window is None else window, exact=_sliding_window, cost=cost
+    )
+
+ALGORITHMS = {
+    "sliding_window": _sliding_window,
+    "gcra": _gcra,
+    "hybrid": _hybrid,
+}
+
+if ALGORITHM not in ALGORITHMS:
+    logger.warning("Unknown RATE_LIMIT_ALGORITHM=%r, using sliding_window", ALGORITHM)
+    ALGORITHM = "sliding_window"
+
+if LOGIN_FAILOVER not in FAILOVER_MODES:
+    logger.warning("Unknown RATE_LIMIT_LOGIN_FAILOVER=%r, using local", LOGIN_FAILOVER)
+    LOGIN_FAILOVER = "local"
 
 async def check_limit_and_hit(ip: str, email: Optional[str]) -> Tuple[bool, int]:
     """
-    檢查是否超出限流；若允許會記一次嘗試。
+    檢查是否超出限流；若允許會記一次嘗試（IP 與 email+IP 兩個維度，原子地一次完成）。
+    演算法由 RATE_LIMIT_ALGORITHM 選擇（sliding_window / gcra / hybrid），回傳格式相同。
     測試或總開關關閉時，直接放行且不觸碰 Redis。
     """
     if not _enabled():
         return True, 0
 
-    r = _get_redis()
-    now_s = time.time()
-
-    # ---- IP 維度 ----
-    kip = _key_ip(ip)
-    await _prune(r, kip, now_s)
-    cnt_ip = await _count(r, kip)
-    if cnt_ip >= MAX_PER_IP:
-        oldest = await _oldest_ts(r, kip)
-        retry_after = max(1, int(WINDOW_SEC - (now_s - (oldest or now_s))))
-        return False, retry_after
-
-    # ---- email+IP 維度 ----
+    dims: List[Tuple[str, int]] = [(_key_ip(ip), MAX_PER_IP)]
     if email:
-        kei = _key_email_ip(email, ip)
-        await _prune(r, kei, now_s)
-        cnt_ei = await _count(r, kei)
-        if cnt_ei >= MAX_PER_EMAIL_IP:
-            oldest = await _oldest_ts(r, kei)
-            retry_after = max(1, int(WINDOW_SEC - (now_s - (oldest or now_s))))
-            return False, retry_after
-
-    # 允許：記錄一次嘗試
-    await _hit(r, kip, now_s)
-    if email:
-        await _hit(r, _key_email_ip(email, ip), now_s)
+        dims.append((_key_email_ip(email, ip), MAX_PER_EMAIL_IP))
+    allowed, retry_after, _ = await _decide(dims, time.time(), None, 1, "login", LOGIN_FAILOVER)
+    return allowed, retry_after
+
+async def consume(
+    key: str,
+    limit: int,
+    window: int,
+    cost: int = 1,
+    policy: str = "custom",
+    failover: str = "open",
+) -> Tuple[bool, int, int]:
+    """
+    通用的單一 key 限流（per-route policy 使用）：在 window 秒內最多 limit 單位，這次用掉 cost 單位。
+    回傳 (allowed, retry_after, remaining)；演算法與登入相同（RATE_LIMIT_ALGORITHM）。
+    Redis 不可用時依 failover 放行或改用本地限流。測試或總開關關閉時直接放行。
+    """
+    if not _enabled():
+        return True, 0, limit
+    return await _decide([(key, limit)], time.time(), window, cost, policy, failover)
 
-    return True, 0
+async def _decide(
+    dims: List[Tuple[str, int]], now_s: float, window: Optional[int], cost: int, policy: str, failover: str
+) -> Tuple[bool, int, int]:
+    try:
+        return await ALGORITHMS[ALGORITHM](_get_redis(), dims, now_s, window, cost)
+    except (RedisConnectionError, RedisTimeoutError) as e:
+        # breaker open 時不會碰網路；ResponseError 等其它錯誤照常往上丟
+        RATE_LIMIT_FAILOVER.labels(policy, failover).inc()
+        logger.debug("Rate limiter failover (%s, %s): %s", policy, failover, e)
+        if failover == "local":
+            return local_limiter.hit(dims, now_s, WINDOW_SEC if window is None else window, cost)
+        return True, 0, min(limit for _, limit in dims)
 
 async def reset_success(ip: str, email: Optional[str]) -> None:
     """
@@ -108,5 +413,10 @@ async def reset_success(ip: str, email: Optional[str]) -> None:
     """
     if not email or not _enabled():
         return
-    r = _get_redis()
-    await r.delete(_key_email_ip(email, ip))
+    key = _key_email_ip(email, ip)
+    hybrid_limiter.forget(key)
+    local_limiter.forget(key)
+    try:
+        await _get_redis().delete(key, _tat_key(key))
+    except (RedisConnectionError, RedisTimeoutError) as e:
+        logger.debug("Rate limit reset skipped, Redis unavailable: %s", e)
@@ -0,0 +1,226 @@
+# app/services/rate_limit_hybrid.py
+"""
+兩層限流（RATE_LIMIT_ALGORITHM=hybrid）：本 worker 的近似計數 + 週期性同步到 Redis。
+
+- 每個 key 在本 worker 記一個 slot：上次同步時 Redis 的計數（known）、最舊成員時間（oldest），
+  以及尚未同步的本地嘗試（pending）。
+- 明確的情況在本地決定，不碰 Redis：
+    * known + pending + cost <= limit - margin 且 pending + cost <= margin → 本地放行，記入 pending
+    * known >= limit 且最舊成員尚未過期 → 本地拒絕（其它 worker 只會讓計數更多）
+- 其它（接近門檻、margin 為 0）→ 先把該 key 的 pending 推上去，再走精確的 sliding window script。
+- 同步：每 RATE_LIMIT_HYBRID_SYNC_MS 以一個 pipeline 把所有 pending 以 sorted-set 成員寫入
+  （與 sliding window 同一個 key / 格式），並讀回最新計數。
+
+margin = floor(limit * RATE_LIMIT_HYBRID_ERROR)：每個 worker 在 Redis 不知情下最多先放行 margin 次，
+因此同一視窗內最多超出約 workers × margin 次。ERROR=0 時每次都走 Redis，結果與 sliding window 完全相同。
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+
+from prometheus_client import Counter
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+HYBRID_DECISIONS = Counter(
+    "rate_limit_hybrid_decisions_total",
+    "Hybrid limiter decisions by path (local_allow / local_deny answered without Redis)",
+    ["path"],
+)
+HYBRID_SYNCS = Counter("rate_limit_hybrid_syncs_total", "Hybrid limiter delta syncs to Redis", ["result"])
+
+# (redis, dims, now, window, cost) -> (allowed, retry_after, remaining)
+Exact = Callable[[Redis, List[Tuple[str, int]], float, float, int], Awaitable[Tuple[bool, int, int]]]
+
+
+@dataclass
+class _Slot:
+    known: int = 0  # 上次同步時 Redis 中視窗內的成員數（含本 worker 已推上去的）
+    oldest: Optional[float] = None  # 上次同步時最舊成員的時間
+    pending: List[float] = field(default_factory=list)  # 本地放行、尚未寫入 Redis 的嘗試時間
+    touched: float = 0.0
+
+
+def _member(ts: float) -> str:
+    return f"{ts:.6f}:{uuid4().hex[:12]}"
+
+
+class HybridLimiter:
+    def __init__(self, sync_interval: float, error: float):
+        self.sync_interval = max(0.0, float(sync_interval))
+        self.error = min(max(0.0, float(error)), 1.0)
+        self._slots: Dict[str, _Slot] = {}
+        self._dirty: set = set()  # 上次同步後被碰過的 key
+        self._last_sync: float = 0.0
+        self._window: float = 0.0
+        self._redis: Optional[Redis] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def margin(self, limit: int) -> int:
+        return int(math.floor(limit * self.error))
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _slot(self, key: str) -> _Slot:
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _Slot()
+        return slot
+
+    def _local(
+        self, dims: List[Tuple[str, int]], now: float, window: float, cost: int
+    ) -> Optional[Tuple[bool, int, int]]:
+        """可在本地判斷時回傳 (allowed, retry_after, remaining)；需要問 Redis 時回傳 None。"""
+        retry = 0.0
+        clear_allow = True
+        remaining: Optional[int] = None
+        for key, limit in dims:
+            slot = self._slots.get(key)
+            known = slot.known if slot else 0
+            pending = len(slot.pending) if slot else 0
+            if slot and known >= limit and slot.oldest is not None and now < slot.oldest + window:
+                retry = max(retry, slot.oldest + window - now)
+            m = self.margin(limit)
+            if not (pending + cost <= m and known + pending + cost <= limit - m):
+                clear_allow = False
+            left = limit - known - pending - cost
+            remaining = left if remaining is None else min(remaining, left)
+        if retry > 0:
+            return False, max(1, math.ceil(retry)), 0
+        if clear_allow:
+            return True, 0, remaining or 0
+        return None
+
+    async def check(
+        self,
+        redis: Redis,
+        dims: List[Tuple[str, int]],
+        now: float,
+        window: float,
+        exact: Exact,
+        cost: int = 1,
+    ) -> Tuple[bool, int, int]:
+        self._redis, self._window = redis, window
+        if not self.running and now - self._last_sync >= self.sync_interval:
+            await self.sync(redis, now, window)  # 沒有背景 task（例如單次腳本 / 測試）時順便同步
+
+        for key, _ in dims:
+            self._slot(key).touched = now
+            self._dirty.add(key)
+
+        decision = self._local(dims, now, window, cost)
+        if decision is not None:
+            allowed = decision[0]
+            if allowed:
+                for key, _ in dims:
+                    self._slots[key].pending.extend([now] * cost)
+            HYBRID_DECISIONS.labels("local_allow" if allowed else "local_deny").inc()
+            return decision
+
+        # 接近門檻：先讓 Redis 看到本 worker 的 pending，再做精確判斷
+        if any(self._slots[key].pending for key, _ in dims):
+            await self._push(redis, [key for key, _ in dims], now, window)
+        allowed, retry_after, remaining = await exact(redis, dims, now, window, cost)
+        if allowed:
+            for key, _ in dims:
+                self._slots[key].known += cost
+        else:
+            for key, limit in dims:
+                self._slots[key].known = max(self._slots[key].known, limit)
+        HYBRID_DECISIONS.labels("redis").inc()
+        return allowed, retry_after, remaining
+
+    async def _push(self, redis: Redis, keys: Iterable[str], now: float, window: float) -> None:
+        """一個 pipeline：寫入 keys 的 pending，並讀回各 key 的計數與最舊成員。"""
+        batch = [(key, self._slots[key], self._slots[key].pending) for key in keys if key in self._slots]
+        if not batch:
+            return
+        for _, slot, pending in batch:
+            slot.pending = []  # 同步期間新的本地放行記到新的 list
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                for key, _, pending in batch:
+                    if pending:
+                        pipe.zadd(key, {_member(ts): ts for ts in pending})
+                        pipe.expire(key, int(math.ceil(window)))
+                    pipe.zremrangebyscore(key, "-inf", now - window)
+                    pipe.zcard(key)
+                    pipe.zrange(key, 0, 0, withscores=True)
+                res = await pipe.execute()
+        except Exception:
+            for _, slot, pending in batch:
+                slot.pending[:0] = pending  # 保留，下次再推
+            HYBRID_SYNCS.labels("error").inc()
+            raise
+
+        i = 0
+        for _, slot, pending in batch:
+            i += 2 if pending else 0
+            count, oldest = int(res[i + 1]), res[i + 2]
+            i += 3
+            slot.known = count
+            slot.oldest = float(oldest[0][1]) if oldest else None
+        HYBRID_SYNCS.labels("ok").inc()
+
+    async def sync(self, redis: Optional[Redis] = None, now: Optional[float] = None, window: Optional[float] = None) -> None:
+        """把上次同步後碰過的 key 推上 Redis 並刷新計數；清掉整個視窗都沒用到的 slot。"""
+        redis = redis or self._redis
+        window = window if window is not None else self._window
+        if redis is None:
+            return
+        now = time.time() if now is None else now
+        self._last_sync = now
+        keys, self._dirty = self._dirty, set()
+        try:
+            await self._push(redis, keys, now, window)
+        except Exception:
+            self._dirty |= keys
+            raise
+        for key in [k for k, s in self._slots.items() if not s.pending and s.touched < now - window]:
+            del self._slots[key]
+
+    def forget(self, key: str) -> None:
+        """reset_success 清空 Redis 的桶後，本地的計數也一併丟掉。"""
+        self._slots.pop(key, None)
+        self._dirty.discard(key)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run(), name="rate-limit-hybrid-sync")
+
+    async def stop(self) -> None:
+        """停止背景同步，並把剩下的 pending 推上 Redis。"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if any(s.pending for s in self._slots.values()):
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Hybrid rate limiter stopped with unsynced hits")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                # Redis 暫時失敗：pending 保留，下個週期重試
+                logger.warning("Hybrid rate limiter sync failed: %s", e)
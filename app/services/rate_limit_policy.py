@@ -0,0 +1,161 @@
+# app/services/rate_limit_policy.py
+"""
+宣告式的 per-route 限流（建立在 rate_limit.consume 之上，演算法同 RATE_LIMIT_ALGORITHM）：
+
+    @router.post("/match", dependencies=[Depends(rate_limited("api", cost=5))])
+
+- Policy = 一份預算：每個 client 在 window 秒內可用 limit 單位。
+- Route 宣告要用哪一份預算與 cost（整數，或依 request 計算的函式，例如依 Content-Length）；
+  多個 route 共用同一份預算時，昂貴的 route 扣得比較多。
+- Client 識別（policy.key）：ip / user（驗證過的 access token sub）/ api_key（X-API-Key，
+  須列在 RATE_LIMIT_API_KEYS，否則任意換 key 就能繞過）/ auto（api_key → user → ip）。
+- Redis 不可用時依 policy.failover：open = 放行；local = 改用本 worker 的限流（見 rate_limit.LocalLimiter）。
+- 回應帶 RateLimit-Limit / -Remaining / -Reset / -Policy；超過時 429 + Retry-After，
+  並記在 rate_limit_rejections_total{policy}。
+
+預設 policy 可用 RATE_LIMIT_POLICIES（JSON）覆寫，例如 '{"api": {"limit": 1200}}'。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, FrozenSet, Optional, Union
+
+from fastapi import HTTPException, Request, Response, status
+from prometheus_client import Counter
+
+from app.core.config import settings
+from app.core.security import decode_access_token
+from app.services import rate_limit
+
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections_total", "Requests rejected by a route rate-limit policy", ["policy"])
+RATE_LIMIT_CONSUMED = Counter("rate_limit_consumed_units_total", "Budget units consumed per policy", ["policy"])
+
+KEY_KINDS = ("ip", "user", "api_key", "auto")
+
+Cost = Union[int, Callable[[Request], int]]
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    name: str
+    limit: int  # 每個 client 在 window 秒內的預算（單位）
+    window: int
+    key: str = "ip"
+    failover: str = "open"
+
+    @property
+    def header(self) -> str:
+        return f"{self.limit};w={self.window}"
+
+
+DEFAULT_POLICIES: Dict[str, RateLimitPolicy] = {
+    # 註冊：每次一個 bcrypt 雜湊，依 IP 限制
+    "signup": RateLimitPolicy("signup", limit=10, window=3600, key="ip", failover="local"),
+    # 一般 API 預算：vision / nutrition 共用，依 route cost 扣
+    "api": RateLimitPolicy("api", limit=600, window=60, key="auto"),
+}
+
+
+def _load_policies(raw: str) -> Dict[str, RateLimitPolicy]:
+    policies = dict(DEFAULT_POLICIES)
+    if not raw.strip():
+        return policies
+    for name, spec in json.loads(raw).items():
+        base = policies.get(name) or RateLimitPolicy(name, limit=int(spec["limit"]), window=int(spec["window"]))
+        policy = replace(base, **{k: spec[k] for k in ("limit", "window", "key", "failover") if k in spec})
+        if policy.key not in KEY_KINDS:
+            raise ValueError(f"RATE_LIMIT_POLICIES[{name}]: unknown key {policy.key!r}")
+        if policy.failover not in rate_limit.FAILOVER_MODES:
+            raise ValueError(f"RATE_LIMIT_POLICIES[{name}]: unknown failover {policy.failover!r}")
+        policies[name] = policy
+    return policies
+
+
+POLICIES: Dict[str, RateLimitPolicy] = _load_policies(settings.RATE_LIMIT_POLICIES)
+_API_KEYS: FrozenSet[str] = frozenset(k.strip() for k in settings.RATE_LIMIT_API_KEYS.split(",") if k.strip())
+
+
+def _client_ip(request: Request) -> str:
+    return (request.client.host if request.client else "unknown") or "unknown"
+
+
+def _api_key_id(request: Request) -> Optional[str]:
+    key = request.headers.get("x-api-key")
+    if not key or key not in _API_KEYS:
+        return None
+    return hashlib.sha256(key.encode()).hexdigest()[:16]  # 不把金鑰本身寫進 Redis key
+
+
+def _user_id(request: Request) -> Optional[str]:
+    auth = request.headers.get("authorization") or ""
+    scheme, _, token = auth.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        claims = decode_access_token(token.strip())  # 驗過簽章（有快取），偽造的 sub 不會拿到別人的預算
+    except Exception:
+        return None
+    if claims.get("type") != "access" or not claims.get("sub"):
+        return None
+    return str(claims["sub"])
+
+
+def client_identity(request: Request, kind: str) -> str:
+    """依 policy.key 取得 client 識別；取不到時退回 IP。"""
+    if kind in ("api_key", "auto"):
+        ident = _api_key_id(request)
+        if ident:
+            return f"key:{ident}"
+    if kind in ("user", "auto"):
+        ident = _user_id(request)
+        if ident:
+            return f"user:{ident}"
+    return f"ip:{_client_ip(request)}"
+
+
+def _headers(policy: RateLimitPolicy, remaining: int, reset: int) -> Dict[str, str]:
+    return {
+        "RateLimit-Limit": str(policy.limit),
+        "RateLimit-Remaining": str(max(0, remaining)),
+        "RateLimit-Reset": str(max(0, reset)),
+        "RateLimit-Policy": policy.header,
+    }
+
+
+def content_length_cost(base: int, per_bytes: int) -> Callable[[Request], int]:
+    """cost = base + 每 per_bytes 的 request body 加 1（依 Content-Length，不需先讀 body）。"""
+    def _cost(request: Request) -> int:
+        try:
+            size = int(request.headers.get("content-length") or 0)
+        except ValueError:
+            size = 0
+        return base + max(0, size) // per_bytes
+    return _cost
+
+
+def rate_limited(policy_name: str, cost: Cost = 1):
+    """產生 FastAPI dependency：對這個 route 套用 policy_name 的預算，每次扣 cost。"""
+    if policy_name not in POLICIES:
+        raise KeyError(f"Unknown rate-limit policy: {policy_name}")
+
+    async def _dependency(request: Request, response: Response) -> None:
+        policy = POLICIES[policy_name]
+        units = min(max(1, cost(request) if callable(cost) else cost), policy.limit)  # 單次最多用掉整份預算
+        key = f"rl:{policy.name}:{client_identity(request, policy.key)}"
+        allowed, retry_after, remaining = await rate_limit.consume(
+            key, policy.limit, policy.window, units, policy=policy.name, failover=policy.failover
+        )
+        if not allowed:
+            RATE_LIMIT_REJECTIONS.labels(policy.name).inc()
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded. Please try again later.",
+                headers={**_headers(policy, remaining, retry_after), "Retry-After": str(retry_after)},
+            )
+        RATE_LIMIT_CONSUMED.labels(policy.name).inc(units)
+        # sliding window 無法便宜地算出精確的重置時間，以 window 作為上界
+        response.headers.update(_headers(policy, remaining, policy.window))
+
+    return _dependency
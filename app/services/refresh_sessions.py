@@ -0,0 +1,144 @@
+# app/services/refresh_sessions.py
+"""
+Refresh token family（登入 session）：
+- login 建立一列 RefreshSession（generation=0），refresh token 帶 fam / gen claims。
+- refresh 以單一條件式 UPDATE 輪替：WHERE id=fam AND generation=gen AND 未撤銷 → generation+1。
+  不再為每次 refresh 寫一列 token_blacklist；儲存量為 O(有效 session)。
+- UPDATE 沒有命中且資料列的 generation 已經更新 → 舊 refresh 被重放，撤銷整個 family。
+
+所有函式都不 commit，由呼叫端（auth.py）決定 transaction 邊界。
+"""
+from __future__ import annotations
+
+import enum
+from datetime import datetime, timezone
+from typing import List, Optional
+from uuid import uuid4
+
+from prometheus_client import Counter
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.refresh_session import RefreshSession
+
+REFRESH_ROTATIONS = Counter(
+    "refresh_rotations_total",
+    "Refresh token rotations by outcome (replay = old generation reused, family revoked)",
+    ["result"],
+)
+
+
+class RotateResult(str, enum.Enum):
+    OK = "ok"
+    REPLAY = "replay"
+    INVALID = "invalid"  # family 不存在 / 已撤銷 / 已過期 / 不屬於此使用者
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)  # DB 多半是 naive UTC
+
+
+def new_family_id() -> str:
+    return uuid4().hex
+
+
+def create_session(
+    db: AsyncSession,
+    family_id: str,
+    user_id: int,
+    expires_at: datetime,
+    user_agent: Optional[str] = None,
+    ip: Optional[str] = None,
+) -> RefreshSession:
+    now = _utcnow()
+    session = RefreshSession(
+        id=family_id,
+        user_id=user_id,
+        generation=0,
+        user_agent=(user_agent or "")[:255] or None,
+        ip=(ip or "")[:64] or None,
+        created_at=now,
+        last_used_at=now,
+        expires_at=expires_at,
+    )
+    db.add(session)
+    return session
+
+
+async def rotate_session(
+    db: AsyncSession,
+    family_id: str,
+    user_id: int,
+    generation: int,
+    new_expires_at: datetime,
+) -> RotateResult:
+    """generation 相符才輪替；否則判斷是重放（撤銷 family）還是單純無效。"""
+    now = _utcnow()
+    res = await db.execute(
+        update(RefreshSession)
+        .where(
+            RefreshSession.id == family_id,
+            RefreshSession.user_id == user_id,
+            RefreshSession.generation == generation,
+            RefreshSession.revoked_at.is_(None),
+            RefreshSession.expires_at > now,
+        )
+        .values(generation=RefreshSession.generation + 1, last_used_at=now, expires_at=new_expires_at)
+        .execution_options(synchronize_session=False)
+    )
+    if res.rowcount == 1:
+        REFRESH_ROTATIONS.labels(RotateResult.OK.value).inc()
+        return RotateResult.OK
+
+    current = (await db.execute(
+        select(RefreshSession.generation).where(
+            RefreshSession.id == family_id,
+            RefreshSession.user_id == user_id,
+            RefreshSession.revoked_at.is_(None),
+        )
+    )).scalar_one_or_none()
+    if current is not None and current > generation:
+        await revoke_session(db, family_id, user_id, reason="replay")
+        REFRESH_ROTATIONS.labels(RotateResult.REPLAY.value).inc()
+        return RotateResult.REPLAY
+
+    REFRESH_ROTATIONS.labels(RotateResult.INVALID.value).inc()
+    return RotateResult.INVALID
+
+
+async def revoke_session(db: AsyncSession, family_id: str, user_id: int, reason: str) -> bool:
+    """撤銷單一 family；回傳是否有撤銷到（不存在或已撤銷回傳 False）。"""
+    res = await db.execute(
+        update(RefreshSession)
+        .where(
+            RefreshSession.id == family_id,
+            RefreshSession.user_id == user_id,
+            RefreshSession.revoked_at.is_(None),
+        )
+        .values(revoked_at=_utcnow(), revoked_reason=reason)
+        .execution_options(synchronize_session=False)
+    )
+    return res.rowcount == 1
+
+
+async def revoke_all_sessions(db: AsyncSession, user_id: int, reason: str = "logout_all") -> int:
+    res = await db.execute(
+        update(RefreshSession)
+        .where(RefreshSession.user_id == user_id, RefreshSession.revoked_at.is_(None))
+        .values(revoked_at=_utcnow(), revoked_reason=reason)
+        .execution_options(synchronize_session=False)
+    )
+    return res.rowcount or 0
+
+
+async def list_active_sessions(db: AsyncSession, user_id: int) -> List[RefreshSession]:
+    q = (
+        select(RefreshSession)
+        .where(
+            RefreshSession.user_id == user_id,
+            RefreshSession.revoked_at.is_(None),
+            RefreshSession.expires_at > _utcnow(),
+        )
+        .order_by(RefreshSession.last_used_at.desc())
+    )
+    return list((await db.execute(q)).scalars().all())
@@ -0,0 +1,246 @@
+# app/services/revocation_filter.py
+"""
+黑名單的行程內過濾器（per-worker）：
+- Bloom filter：記住所有「尚未過期」的已撤銷 jti；否定答案代表一定沒被撤銷，可直接略過 DB。
+- recent：最近撤銷的 jti（精確集合，依 expires_at 修剪），命中即可直接判定撤銷。
+- 同步：每 REVOCATION_FILTER_SYNC_SEC 依 token_blacklist.id 水位線做增量同步，
+  每 REVOCATION_FILTER_REBUILD_SEC 重建一次 Bloom（清掉已過期的 jti）。
+
+本 worker 的撤銷（auth.py 的 logout / refresh / logout-all）會呼叫 add() 立即生效；
+其它 worker 的撤銷則最多延遲一個同步週期才會被看到。
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.token_blacklist import TokenBlacklist
+
+# ---- Metrics（由既有的 /metrics 匯出）----
+FILTER_CHECKS = Counter(
+    "revocation_filter_checks_total",
+    "Blacklist checks by outcome (negative = DB skipped, false_positive = Bloom said maybe but DB said no)",
+    ["result"],
+)
+FILTER_SYNCS = Counter(
+    "revocation_filter_syncs_total",
+    "Revocation filter syncs from token_blacklist",
+    ["kind"],
+)
+FILTER_ENTRIES = Gauge(
+    "revocation_filter_entries",
+    "jtis currently inserted into the revocation Bloom filter",
+)
+
+
+# 增量同步時往回重掃的 id 數量
+_ID_OVERLAP = 100
+
+
+def _utcnow() -> datetime:
+    # DB 多半是 naive UTC（與 blacklist_cleanup 一致）
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class BloomFilter:
+    """固定大小的 Bloom filter（double hashing，blake2b）。"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, int(capacity))
+        self.capacity = capacity
+        error_rate = min(max(float(error_rate), 1e-9), 0.5)
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterator[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationFilter:
+    def __init__(
+        self,
+        capacity: int,
+        error_rate: float,
+        recent_max: int,
+        sync_interval: float,
+        rebuild_interval: float,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.recent_max = recent_max
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.reset()
+
+    def reset(self) -> None:
+        """清空狀態；下一次檢查會重新從 DB 全量載入。"""
+        self._bloom = BloomFilter(self.capacity, self.error_rate)
+        self._recent: "OrderedDict[str, Optional[datetime]]" = OrderedDict()
+        self._count = 0
+        self._watermark = 0
+        self._loaded_at: Optional[float] = None
+        self._synced_at = 0.0
+        self._syncing = False
+        FILTER_ENTRIES.set(0)
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded_at is not None
+
+    def _insert(self, jti: str, expires_at: Optional[datetime]) -> None:
+        if jti not in self._bloom:
+            self._bloom.add(jti)
+            self._count += 1
+        self._recent[jti] = expires_at
+        self._recent.move_to_end(jti)
+        while len(self._recent) > self.recent_max:
+            self._recent.popitem(last=False)
+        FILTER_ENTRIES.set(self._count)
+
+    def add(self, jti: str, expires_at: Optional[datetime] = None) -> None:
+        """本 worker 剛撤銷的 jti（DB commit 之後呼叫）。"""
+        if jti:
+            self._insert(jti, expires_at)
+
+    def _prune_recent(self, now: datetime) -> None:
+        expired = [j for j, exp in self._recent.items() if exp is not None and exp < now]
+        for j in expired:
+            del self._recent[j]
+
+    def _in_recent(self, jti: str) -> bool:
+        if jti not in self._recent:
+            return False
+        exp = self._recent[jti]
+        if exp is not None and exp < _utcnow():
+            del self._recent[jti]
+            return False
+        return True
+
+    async def _rebuild(self, db: AsyncSession) -> None:
+        now = _utcnow()
+        # 先取水位線，之後新增的列交給增量同步
+        watermark = (await db.execute(select(func.max(TokenBlacklist.id)))).scalar() or 0
+        q = select(TokenBlacklist.id, TokenBlacklist.jti, TokenBlacklist.expires_at).where(
+            TokenBlacklist.id <= watermark,
+            or_(TokenBlacklist.expires_at.is_(None), TokenBlacklist.expires_at >= now),
+        )
+        rows = (await db.execute(q)).all()
+
+        recent = self._recent
+        self._bloom = BloomFilter(max(self.capacity, len(rows) * 2), self.error_rate)
+        self._recent = OrderedDict()
+        self._count = 0
+        for _id, jti, exp in rows:
+            self._insert(jti, exp)
+        # 保留本地剛加入、但可能還沒被這次查詢看到的 jti
+        for jti, exp in recent.items():
+            if jti not in self._recent and (exp is None or exp >= now):
+                self._insert(jti, exp)
+
+        self._watermark = int(watermark)
+        self._loaded_at = time.monotonic()
+        FILTER_SYNCS.labels("rebuild").inc()
+
+    async def _incremental(self, db: AsyncSession) -> None:
+        now = _utcnow()
+        q = (
+            select(TokenBlacklist.id, TokenBlacklist.jti, TokenBlacklist.expires_at)
+            # 往回多看一小段 id：序號分配與 commit 順序不一定相同
+            .where(TokenBlacklist.id > self._watermark - _ID_OVERLAP)
+            .order_by(TokenBlacklist.id)
+        )
+        for _id, jti, exp in (await db.execute(q)).all():
+            self._watermark = max(self._watermark, int(_id))
+            if exp is None or exp >= now:
+                self._insert(jti, exp)
+        self._prune_recent(now)
+        FILTER_SYNCS.labels("incremental").inc()
+
+    async def sync(self, db: AsyncSession, force: bool = False) -> None:
+        """依時間間隔決定做增量同步或全量重建；同時間只允許一個 coroutine 執行。"""
+        if self._syncing:
+            return
+        now = time.monotonic()
+        if not force and self.ready and now - self._synced_at < self.sync_interval:
+            return
+        self._syncing = True
+        try:
+            if (
+                not self.ready
+                or now - (self._loaded_at or 0.0) >= self.rebuild_interval
+                or self._count > self._bloom.capacity
+            ):
+                await self._rebuild(db)
+            else:
+                await self._incremental(db)
+            self._synced_at = now
+        finally:
+            self._syncing = False
+
+    async def is_revoked(self, db: AsyncSession, jti: str) -> bool:
+        await self.sync(db)
+        if not self.ready:
+            # 另一個 coroutine 正在做第一次載入：保守地直接查 DB
+            FILTER_CHECKS.labels("not_ready").inc()
+            return await _db_is_revoked(db, jti)
+
+        if self._in_recent(jti):
+            FILTER_CHECKS.labels("recent_hit").inc()
+            return True
+        if jti not in self._bloom:
+            FILTER_CHECKS.labels("negative").inc()
+            return False
+
+        revoked = await _db_is_revoked(db, jti)
+        FILTER_CHECKS.labels("db_hit" if revoked else "false_positive").inc()
+        return revoked
+
+
+async def _db_is_revoked(db: AsyncSession, jti: str) -> bool:
+    q = select(TokenBlacklist.id).where(TokenBlacklist.jti == jti)
+    result = await db.execute(q)
+    return result.scalar_one_or_none() is not None
+
+
+# 每個 worker 一份
+revocation_filter = RevocationFilter(
+    capacity=settings.REVOCATION_FILTER_CAPACITY,
+    error_rate=settings.REVOCATION_FILTER_ERROR_RATE,
+    recent_max=settings.REVOCATION_FILTER_RECENT_MAX,
+    sync_interval=settings.REVOCATION_FILTER_SYNC_SEC,
+    rebuild_interval=settings.REVOCATION_FILTER_REBUILD_SEC,
+)
+
+
+async def is_token_revoked(db: AsyncSession, jti: str) -> bool:
+    """deps.py 使用的入口：依設定走 filter 或直接查 DB。"""
+    if not settings.REVOCATION_FILTER_ENABLED:
+        return await _db_is_revoked(db, jti)
+    return await revocation_filter.is_revoked(db, jti)
+
+
+def record_revocation(jti: Optional[str], expires_at: Optional[datetime] = None) -> None:
+    """auth.py 在黑名單寫入 commit 後呼叫，讓本 worker 立即生效。"""
+    if jti and settings.REVOCATION_FILTER_ENABLED:
+        revocation_filter.add(jti, expires_at)
@@ -0,0 +1,143 @@
+# app/services/revocation_store.py
+"""
+Token 撤銷（黑名單）的儲存後端，以 REVOCATION_BACKEND 選擇：
+- "sql"（預設）：寫入 token_blacklist 表，由呼叫端 commit；查詢經過 revocation_filter，
+  過期列由 APScheduler 的 cleanup job 定期刪除。revocation_writer 啟動時改為 write-behind 批次寫入。
+- "redis"：每個 jti 一個 key，TTL = token 剩餘壽命；過期由 Redis 自動回收，查詢為單一 EXISTS。
+  寫入立即生效，不依賴 DB commit。使用共用 client（app/core/redis_client.py）；Redis 不可用時
+  直接丟錯（不像限流可以 fail open，撤銷狀態不能猜）。
+
+auth.py 只呼叫 revoke_token()，deps.py 只呼叫 is_token_revoked()，不需知道用哪個後端。
+"""
+from __future__ import annotations
+
+import math
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.redis_client import get_redis_client
+from app.models.token_blacklist import TokenBlacklist
+from app.services import revocation_filter
+from app.services.revocation_writer import revocation_writer
+
+
+class RevocationStore(ABC):
+    name: str = ""
+
+    @abstractmethod
+    async def revoke(
+        self,
+        db: AsyncSession,
+        jti: str,
+        token_type: str,
+        user_id: Optional[int],
+        expires_at: Optional[datetime],
+    ) -> None:
+        """記錄撤銷；expires_at 為 naive UTC（與 token_blacklist 一致）。"""
+
+    @abstractmethod
+    async def is_revoked(self, db: AsyncSession, jti: str) -> bool:
+        ...
+
+
+class SqlRevocationStore(RevocationStore):
+    name = "sql"
+
+    async def revoke(self, db, jti, token_type, user_id, expires_at) -> None:
+        if revocation_writer.running:
+            # write-behind：與其它請求的撤銷合併成一次 INSERT + commit
+            await revocation_writer.submit(jti, token_type, user_id, expires_at)
+            return
+        # 交給呼叫端 commit（可與其它寫入同一個 transaction）
+        db.add(TokenBlacklist(
+            jti=jti,
+            token_type=token_type,
+            user_id=user_id,
+            expires_at=expires_at,
+        ))
+
+    async def is_revoked(self, db, jti) -> bool:
+        if revocation_writer.is_pending(jti):
+            return True
+        return await revocation_filter.is_token_revoked(db, jti)
+
+
+class RedisRevocationStore(RevocationStore):
+    name = "redis"
+
+    def __init__(self, client: Optional[Redis] = None, prefix: Optional[str] = None):
+        self._redis = client
+        self.prefix = prefix if prefix is not None else settings.REVOCATION_REDIS_PREFIX
+
+    def _client(self) -> Redis:
+        if self._redis is None:
+            self._redis = get_redis_client()
+        return self._redis
+
+    def _key(self, jti: str) -> str:
+        return f"{self.prefix}{jti}"
+
+    @staticmethod
+    def _ttl_seconds(expires_at: Optional[datetime]) -> int:
+        if expires_at is None:
+            # 沒有 exp 的 token：保留到最長的 token 壽命
+            return int(settings.REFRESH_TOKEN_EXPIRE_MINUTES) * 60
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return math.ceil((expires_at - now).total_seconds())
+
+    async def revoke(self, db, jti, token_type, user_id, expires_at) -> None:
+        ttl = self._ttl_seconds(expires_at)
+        if ttl <= 0:
+            return  # 已過期的 token 本來就無法使用
+        await self._client().set(self._key(jti), token_type, ex=ttl)
+
+    async def is_revoked(self, db, jti) -> bool:
+        return bool(await self._client().exists(self._key(jti)))
+
+
+STORES: Dict[str, Callable[..., RevocationStore]] = {
+    SqlRevocationStore.name: SqlRevocationStore,
+    RedisRevocationStore.name: RedisRevocationStore,
+}
+
+
+_store: RevocationStore
+
+
+def configure_revocation_store(name: Optional[str] = None, **kwargs: Any) -> RevocationStore:
+    """選擇撤銷後端（預設 settings.REVOCATION_BACKEND）；kwargs 傳給後端建構子（測試注入 client 用）。"""
+    global _store
+    key = (name or settings.REVOCATION_BACKEND or "sql").lower()
+    factory = STORES.get(key)
+    if factory is None:
+        raise ValueError(f"Unknown REVOCATION_BACKEND={key!r}; choose one of {sorted(STORES)}")
+    _store = factory(**kwargs)
+    return _store
+
+
+configure_revocation_store()
+
+
+def get_revocation_store() -> RevocationStore:
+    return _store
+
+
+async def revoke_token(
+    db: AsyncSession,
+    jti: str,
+    token_type: str,
+    user_id: Optional[int] = None,
+    expires_at: Optional[datetime] = None,
+) -> None:
+    """auth.py 使用的寫入入口；sql 後端需由呼叫端 commit。"""
+    await _store.revoke(db, jti, token_type, user_id, expires_at)
+
+
+async def is_token_revoked(db: AsyncSession, jti: str) -> bool:
+    """deps.py 使用的查詢入口。"""
+    return await _store.is_revoked(db, jti)
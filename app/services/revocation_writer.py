@@ -0,0 +1,172 @@
+# app/services/revocation_writer.py
+"""
+token_blacklist 的 write-behind 寫入器（group commit）：
+- auth.py 的 logout / logout-all / refresh 透過 revocation_store 呼叫 submit()，
+  jti 先放進本行程的有界佇列，並立即對本 worker 生效（is_pending + revocation_filter）。
+- 背景 task 每 REVOCATION_WRITE_INTERVAL_MS 或累積 REVOCATION_WRITE_BATCH 筆時，
+  以一個多列 INSERT（jti 重複時略過）+ 一次 commit 寫入；登出潮時 commit 次數大幅下降。
+- 佇列滿時 submit() 會同步等待一次 flush（背壓），不會無限制佔用記憶體。
+- lifespan 關閉時 stop() 會把剩下的全部寫完。
+
+代價：行程異常終止時，最多遺失最後一個 flush 間隔內的撤銷；其它 worker 要等 flush
+加上各自的 filter 同步週期才看得到。預設關閉（REVOCATION_WRITE_BEHIND）。
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.token_blacklist import TokenBlacklist
+from app.services.revocation_filter import record_revocation
+
+logger = logging.getLogger(__name__)
+
+# ---- Metrics（由既有的 /metrics 匯出）----
+WRITER_FLUSHES = Counter("revocation_writer_flushes_total", "Multi-row token_blacklist inserts committed", ["result"])
+WRITER_BATCH_SIZE = Histogram(
+    "revocation_writer_batch_size",
+    "Revocations written per commit",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+WRITER_QUEUE_DEPTH = Gauge("revocation_writer_queue_depth", "Revocations waiting to be flushed")
+
+
+def _insert_ignoring_duplicates(dialect: str, rows: List[Dict[str, Any]]):
+    """多列 INSERT；同一 jti 已存在時略過（同一 token 被並行登出兩次）。"""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(TokenBlacklist).values(rows).on_conflict_do_nothing(index_elements=["jti"])
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(TokenBlacklist).values(rows).on_conflict_do_nothing(index_elements=["jti"])
+    return insert(TokenBlacklist).values(rows)
+
+
+class RevocationWriter:
+    def __init__(
+        self,
+        max_batch: int,
+        interval: float,
+        max_queue: int,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+    ):
+        self.max_batch = max(1, int(max_batch))
+        self.interval = max(0.0, float(interval))
+        self.max_queue = max(self.max_batch, int(max_queue))
+        self._session_factory = session_factory
+        self._pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def is_pending(self, jti: str) -> bool:
+        """已提交但尚未寫入 DB 的 jti（本 worker 的黑名單檢查使用）。"""
+        return jti in self._pending
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run(), name="revocation-writer")
+
+    async def stop(self) -> None:
+        """停止背景 task 並寫完佇列中剩下的撤銷。"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._pending:
+            await self.flush()
+        if self._pending:
+            logger.error("Revocation writer stopped with %d unflushed revocations", len(self._pending))
+
+    async def submit(
+        self,
+        jti: str,
+        token_type: str,
+        user_id: Optional[int],
+        expires_at: Optional[datetime],
+    ) -> None:
+        if len(self._pending) >= self.max_queue:
+            await self.flush()  # 背壓：佇列滿時由呼叫端協助寫入
+
+        self._pending[jti] = {
+            "jti": jti,
+            "token_type": token_type,
+            "user_id": user_id,
+            "expires_at": expires_at,
+            "created_at": datetime.utcnow(),
+        }
+        WRITER_QUEUE_DEPTH.set(len(self._pending))
+        record_revocation(jti, expires_at)  # 本 worker 立即生效
+        if self._wake is not None:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        """把佇列寫入 DB（每 max_batch 筆一個 transaction）；回傳寫入筆數。失敗時保留在佇列中。"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        written = 0
+        async with self._lock:
+            while self._pending:
+                rows = list(islice(self._pending.values(), self.max_batch))
+                try:
+                    async with self._session_factory() as db:
+                        await db.execute(_insert_ignoring_duplicates(db.get_bind().dialect.name, rows))
+                        await db.commit()
+                except Exception:
+                    WRITER_FLUSHES.labels("error").inc()
+                    logger.exception("Revocation writer flush failed (%d rows kept for retry)", len(self._pending))
+                    break
+                for row in rows:
+                    # 寫入期間同一 jti 可能被再次提交，只移除這批寫入的那一筆
+                    if self._pending.get(row["jti"]) is row:
+                        del self._pending[row["jti"]]
+                WRITER_FLUSHES.labels("ok").inc()
+                WRITER_BATCH_SIZE.observe(len(rows))
+                written += len(rows)
+            WRITER_QUEUE_DEPTH.set(len(self._pending))
+        return written
+
+    async def _run(self) -> None:
+        assert self._wake is not None
+        while True:
+            if not self._pending:
+                await self._wake.wait()
+            self._wake.clear()
+            if len(self._pending) < self.max_batch:
+                # 等一小段時間讓並行的請求一起搭這次 commit
+                await asyncio.sleep(self.interval)
+            before = len(self._pending)
+            await self.flush()
+            if self._pending and len(self._pending) >= before:
+                await asyncio.sleep(1.0)  # DB 失敗：稍後重試，避免忙迴圈
+
+
+# 每個 worker 一份；由 lifespan 啟動（REVOCATION_WRITE_BEHIND=1 時）
+revocation_writer = RevocationWriter(
+    max_batch=settings.REVOCATION_WRITE_BATCH,
+    interval=settings.REVOCATION_WRITE_INTERVAL_MS / 1000.0,
+    max_queue=settings.REVOCATION_WRITE_MAX_QUEUE,
+)
@@ -7,8 +7,13 @@ from fastapi import FastAPI  # ← 新增：型別標註用
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
+from app.core.config import settings
+from app.core.redis_client import close_redis_clients
 from app.db.session import get_db
-from app.services.blacklist_cleanup import cleanup_expired_blacklist
+from app.services.blacklist_cleanup import purge_expired_blacklist, purge_expired_sessions
+from app.services.password_pool import password_pool
+from app.services import rate_limit
+from app.services.revocation_writer import revocation_writer
 
 logger = logging.getLogger(__name__)
 
@@ -22,25 +27,39 @@ async def lifespan_scheduler(app: FastAPI) -> AsyncGenerator[None, None]:
     """
     global scheduler
     scheduler = AsyncIOScheduler(timezone="UTC")
-    # 每 30 分鐘跑一次清理黑名單
+    # 每 30 分鐘跑一次清理（過期黑名單 + 過期 refresh family）
     scheduler.add_job(run_cleanup_job, IntervalTrigger(minutes=30))
     scheduler.start()
-    logger.info("APScheduler started: blacklist cleanup every 30 minutes")
+    logger.info("APScheduler started: cleanup every 30 minutes")
+    if settings.REVOCATION_WRITE_BEHIND and settings.REVOCATION_BACKEND.lower() == "sql":
+        await revocation_writer.start()
+        logger.info("Revocation write-behind enabled")
+    if rate_limit.ALGORITHM == "hybrid" and rate_limit._enabled():
+        await rate_limit.hybrid_limiter.start()
+        logger.info("Hybrid rate limiter sync started")
     try:
         yield
     finally:
         if scheduler:
             scheduler.shutdown(wait=False)
             logger.info("APScheduler shutdown")
+        # 關閉前把尚未寫入的撤銷全部 flush
+        await revocation_writer.stop()
+        await rate_limit.hybrid_limiter.stop()
+        await close_redis_clients()
+        password_pool.shutdown()
 
 async def run_cleanup_job():
-    """排程作業：建立一次性 DB session 來清理過期黑名單。"""
+    """排程作業：建立一次性 DB session，分批清理過期黑名單與 refresh family（每批各自 commit）。"""
     agen = get_db()  # async generator
     db = await agen.__anext__()  # 取得 AsyncSession
     try:
-        deleted = await cleanup_expired_blacklist(db)
-        await db.commit()
-        logger.info("Blacklist cleanup done", extra={"deleted": deleted})
+        # redis 撤銷後端靠 key TTL 過期，不需要清理 token_blacklist
+        if settings.REVOCATION_BACKEND.lower() == "sql":
+            stats = await purge_expired_blacklist(db)
+            logger.info("Blacklist cleanup done", extra=stats.as_dict())
+        stats = await purge_expired_sessions(db)
+        logger.info("Refresh session cleanup done", extra=stats.as_dict())
     except Exception as e:
         logger.exception("Blacklist cleanup failed: %s", e)
         try:
@@ -0,0 +1,99 @@
+# app/services/user_cache.py
+"""
+get_current_user 的使用者快取（per-worker，LRU + TTL）：
+user_id -> CachedUser（token_version + 回應所需的最小欄位）。
+
+- logout-all 會立即 invalidate 本 worker 的項目；
+  其它 worker 最多在 USER_CACHE_TTL_SEC 後看到新的 token_version。
+- 只有宣告使用 get_current_user_cached 的端點才會拿到投影物件，
+  需要可寫入 ORM 物件的端點請繼續用 get_current_user。
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from prometheus_client import Counter, Histogram
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.users import User
+
+USER_CACHE_REQUESTS = Counter(
+    "user_cache_requests_total",
+    "Auth user cache lookups (stale = cached token_version older than the token's ver)",
+    ["result"],
+)
+USER_CACHE_HIT_AGE = Histogram(
+    "user_cache_hit_age_seconds",
+    "Age of user cache entries when served",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """User 的唯讀投影（欄位與 UserRead 相容）。"""
+
+    id: int
+    email: str
+    name: str
+    token_version: int
+    created_at: datetime
+
+    @classmethod
+    def from_orm(cls, user: User) -> "CachedUser":
+        return cls(
+            id=int(user.id),
+            email=user.email,
+            name=user.name,
+            token_version=int(getattr(user, "token_version", 0) or 0),
+            created_at=user.created_at,
+        )
+
+
+_cache: "TTLCache[int, CachedUser]" = TTLCache(
+    maxsize=settings.USER_CACHE_MAX_ENTRIES,
+    ttl=settings.USER_CACHE_TTL_SEC,
+)
+
+
+def _enabled() -> bool:
+    return settings.USER_CACHE_ENABLED
+
+
+def get_cached_user(user_id: int, ver_in_token: Optional[int]) -> Optional[CachedUser]:
+    """
+    命中且 token_version 不比 token 舊時回傳投影；
+    token 的 ver 比快取新（代表快取過時）時視為 miss，交由 DB 重新載入。
+    """
+    if not _enabled():
+        return None
+    entry = _cache.get_entry(user_id)
+    if entry is None:
+        USER_CACHE_REQUESTS.labels("miss").inc()
+        return None
+    cached, age = entry
+    if ver_in_token is not None and int(ver_in_token) > cached.token_version:
+        USER_CACHE_REQUESTS.labels("stale").inc()
+        _cache.pop(user_id)
+        return None
+    USER_CACHE_REQUESTS.labels("hit").inc()
+    USER_CACHE_HIT_AGE.observe(age)
+    return cached
+
+
+def cache_user(user: User) -> CachedUser:
+    projection = CachedUser.from_orm(user)
+    if _enabled():
+        _cache.set(projection.id, projection)
+    return projection
+
+
+def invalidate_user(user_id: int) -> None:
+    _cache.pop(int(user_id))
+
+
+def clear_user_cache() -> None:
+    _cache.clear()
@@ -0,0 +1,70 @@
+# scripts/bench_jwt.py
+"""
+JWT 後端吞吐量 benchmark（tokens/s），單執行緒與 N 個 process。
+
+  python -m scripts.bench_jwt --seconds 2 --procs 4
+  python -m scripts.bench_jwt --backends native
+
+decode_access_token 會關閉 claims 快取，量的是真正的簽章驗證成本。
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List
+
+from app.core import security
+from app.core.config import settings
+from app.core.jwt_backends import BACKENDS
+
+OPS = ("issue_token_pair", "decode_access_token", "decode_refresh_token")
+
+
+def _make_op(op: str) -> Callable[[], object]:
+    access, refresh = security.issue_token_pair(1, 0)
+    if op == "issue_token_pair":
+        return lambda: security.issue_token_pair(1, 0)
+    if op == "decode_access_token":
+        return lambda: security.decode_access_token(access)
+    return lambda: security.decode_refresh_token(refresh)
+
+
+def _run(backend: str, op: str, seconds: float) -> int:
+    """在目前 process 內執行 op 約 seconds 秒，回傳次數。"""
+    settings.ACCESS_TOKEN_CACHE_ENABLED = False
+    security.configure_jwt_backend(backend)
+    fn = _make_op(op)
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            fn()
+        count += 100
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JWT backends")
+    parser.add_argument("--backends", nargs="*", default=sorted(BACKENDS))
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--procs", type=int, default=4)
+    args = parser.parse_args()
+
+    results: Dict[str, List[str]] = {}
+    with ProcessPoolExecutor(max_workers=args.procs) as pool:
+        for backend in args.backends:
+            for op in OPS:
+                single = _run(backend, op, args.seconds) / args.seconds
+                futures = [pool.submit(_run, backend, op, args.seconds) for _ in range(args.procs)]
+                multi = sum(f.result() for f in futures) / args.seconds
+                results.setdefault(op, []).append(
+                    f"  {backend:<8} 1 proc {single:12,.0f}/s   {args.procs} procs {multi:12,.0f}/s"
+                )
+
+    for op in OPS:
+        print(op)
+        for line in results.get(op, []):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
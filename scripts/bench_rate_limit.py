@@ -0,0 +1,151 @@
+# scripts/bench_rate_limit.py
+"""
+登入限流的 Redis 成本 benchmark：每次 check_limit_and_hit 的延遲與 round trip 數。
+
+  python -m scripts.bench_rate_limit                  # 內建 fakeredis，每個 round trip 模擬 0.5 ms 網路延遲
+  python -m scripts.bench_rate_limit --rtt-ms 2 -n 500
+  python -m scripts.bench_rate_limit --redis-url redis://localhost:6379/15   # 真實 Redis（會寫入 rl:bench:* key）
+
+模式：
+  legacy    改版前的逐一指令（每個維度 zremrangebyscore / zcard /（zrange）/ zadd）
+  script    Lua script，一個 round trip
+  pipeline  無 script 時的 MULTI 後備，兩個 round trip
+  gcra      GCRA（RATE_LIMIT_ALGORITHM=gcra），一個 round trip，每個 key 只存一個 TAT
+  hybrid    本地計數 + 週期同步（RATE_LIMIT_ALGORITHM=hybrid）；遠低於上限時不碰 Redis，
+            round trips/op 為同步成本的攤提
+
+另外列出單一 key 在「剛好達到上限」時的記憶體：sorted set 隨 limit 成長，GCRA 固定一個字串。
+（fakeredis 沒有 MEMORY USAGE，以 DUMP 的長度近似）
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import fakeredis
+from fakeredis._clients._async import FakeAsyncRedisConnection
+from redis.asyncio import ConnectionPool, Redis
+
+from app.services import rate_limit
+
+
+class _LatencyConnection(FakeAsyncRedisConnection):
+    """每次送出（單一指令或整個 pipeline）前 sleep rtt，模擬網路 round trip。"""
+
+    rtt: float = 0.0
+    round_trips: int = 0
+
+    async def send_packed_command(self, command, check_health=True):
+        type(self).round_trips += 1
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+        return await super().send_packed_command(command, check_health)
+
+
+async def _legacy(r: Redis, ip: str, email: str, now_s: float) -> Tuple[bool, int]:
+    """改版前的實作（逐一指令、先查後寫）。"""
+    window = rate_limit.WINDOW_SEC
+    for key, limit in ((rate_limit._key_ip(ip), rate_limit.MAX_PER_IP),
+                       (rate_limit._key_email_ip(email, ip), rate_limit.MAX_PER_EMAIL_IP)):
+        await r.zremrangebyscore(key, "-inf", now_s - window)
+        if int(await r.zcard(key)) >= limit:
+            oldest = await r.zrange(key, 0, 0, withscores=True)
+            return False, max(1, int(window - (now_s - (float(oldest[0][1]) if oldest else now_s))))
+    await r.zadd(rate_limit._key_ip(ip), {f"{now_s:.3f}": now_s})
+    await r.zadd(rate_limit._key_email_ip(email, ip), {f"{now_s:.3f}": now_s})
+    return True, 0
+
+
+def _dims(ip: str, email: str):
+    return [(rate_limit._key_ip(ip), rate_limit.MAX_PER_IP),
+            (rate_limit._key_email_ip(email, ip), rate_limit.MAX_PER_EMAIL_IP)]
+
+
+MODES: Dict[str, Callable[[Redis, str, str, float], object]] = {
+    "legacy": _legacy,
+    "script": lambda r, ip, email, now_s: rate_limit._sliding_window_script(r, _dims(ip, email), now_s),
+    "pipeline": lambda r, ip, email, now_s: rate_limit._sliding_window_pipeline(r, _dims(ip, email), now_s),
+    "gcra": lambda r, ip, email, now_s: rate_limit._gcra_script(r, _dims(ip, email), now_s),
+    "hybrid": lambda r, ip, email, now_s: rate_limit.hybrid_limiter.check(
+        r, _dims(ip, email), now_s, rate_limit.WINDOW_SEC, exact=rate_limit._sliding_window
+    ),
+}
+
+
+async def _key_bytes(r: Redis, key: str) -> int:
+    try:
+        return int(await r.memory_usage(key) or 0)
+    except Exception:
+        return len(await r.dump(key) or b"")
+
+
+async def _memory(r: Redis, limit: int) -> Dict[str, Tuple[str, int]]:
+    """以 limit 次請求打滿同一個 key，回傳各演算法 (key 型別, bytes)。"""
+    dims = {
+        "sliding_window": [("rl:bench:mem:sw", limit)],
+        "gcra": [("rl:bench:mem:gcra", limit)],
+    }
+    now_s = time.time()
+    for _ in range(limit):
+        await rate_limit._sliding_window_script(r, dims["sliding_window"], now_s)
+        await rate_limit._gcra_script(r, dims["gcra"], now_s)
+    out = {}
+    for name, ((key, _),) in dims.items():
+        stored = rate_limit._tat_key(key) if name == "gcra" else key
+        out[name] = (await r.type(stored), await _key_bytes(r, stored))
+        await r.delete(stored)
+    return out
+
+
+async def _bench(r: Redis, mode: str, n: int) -> Tuple[List[float], float]:
+    fn = MODES[mode]
+    samples: List[float] = []
+    _LatencyConnection.round_trips = 0
+    for i in range(n):
+        # 每次不同 IP / email：量的是一般（未超限）登入路徑
+        ip, email = f"bench-{mode}-{i}", f"user{i}@bench"
+        t0 = time.perf_counter()
+        await fn(r, ip, email, time.time())
+        samples.append(time.perf_counter() - t0)
+    return samples, _LatencyConnection.round_trips / n
+
+
+def _client(redis_url: Optional[str], rtt_ms: float) -> Redis:
+    if redis_url:
+        return Redis.from_url(redis_url, decode_responses=True)
+    _LatencyConnection.rtt = rtt_ms / 1000.0
+    pool = ConnectionPool(connection_class=_LatencyConnection, server=fakeredis.FakeServer(), decode_responses=True)
+    return Redis(connection_pool=pool)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark login rate-limit Redis round trips")
+    parser.add_argument("--modes", nargs="*", default=list(MODES))
+    parser.add_argument("-n", type=int, default=300)
+    parser.add_argument("--rtt-ms", type=float, default=0.5, help="simulated round-trip latency (fakeredis only)")
+    parser.add_argument("--redis-url", default=None, help="benchmark a real Redis instead of fakeredis")
+    parser.add_argument("--limits", type=int, nargs="*", default=[5, 100, 1000], help="limits for the memory comparison")
+    args = parser.parse_args()
+
+    r = _client(args.redis_url, args.rtt_ms)
+    await r.ping()
+    for mode in args.modes:
+        await MODES[mode](r, "warmup", "warmup@bench", time.time())  # 載入 script / 建立連線
+        samples, rtts = await _bench(r, mode, args.n)
+        samples.sort()
+        p50 = samples[len(samples) // 2] * 1000
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+        rtt_note = f"   {rtts:4.1f} round trips/op" if not args.redis_url else ""
+        print(f"{mode:<9} mean {statistics.fmean(samples) * 1000:7.3f} ms   p50 {p50:7.3f} ms   p99 {p99:7.3f} ms{rtt_note}")
+
+    print()
+    for limit in args.limits:
+        mem = await _memory(r, limit)
+        row = "   ".join(f"{name} {kind:<5} {size:6d} B" for name, (kind, size) in mem.items())
+        print(f"limit {limit:<5} {row}")
+    await r.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+# scripts/bench_revocation_store.py
+"""
+撤銷後端 benchmark：比較 sql（token_blacklist）與 redis（jti key + TTL）的寫入 / 查詢延遲。
+
+  python -m scripts.bench_revocation_store -n 2000
+  python -m scripts.bench_revocation_store --backends sql --with-filter
+
+使用 settings 的 DATABASE_URL / REDIS_URL；寫入的是 60 秒後過期的隨機 jti。
+sql 預設關閉 revocation_filter，量的是資料表本身（--with-filter 則量含 Bloom filter 的路徑）。
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+from uuid import uuid4
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.services import revocation_store
+from app.services.revocation_filter import revocation_filter
+
+
+def _summary(samples: List[float]) -> str:
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2] * 1000
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+    mean = statistics.fmean(samples) * 1000
+    return f"mean {mean:8.3f} ms   p50 {p50:8.3f} ms   p99 {p99:8.3f} ms   {len(samples) / sum(samples):10,.0f} ops/s"
+
+
+async def _bench(backend: str, n: int) -> Dict[str, List[float]]:
+    store = revocation_store.configure_revocation_store(backend)
+    results: Dict[str, List[float]] = {"revoke": [], "lookup_hit": [], "lookup_miss": []}
+    jtis = [f"bench-{uuid4()}" for _ in range(n)]
+    expires_at = datetime.utcnow() + timedelta(seconds=60)
+
+    async with AsyncSessionLocal() as db:
+        for jti in jtis:
+            t0 = time.perf_counter()
+            await store.revoke(db, jti, "access", None, expires_at)
+            if backend == "sql":
+                await db.commit()
+            results["revoke"].append(time.perf_counter() - t0)
+
+        for jti in jtis:
+            t0 = time.perf_counter()
+            await store.is_revoked(db, jti)
+            results["lookup_hit"].append(time.perf_counter() - t0)
+
+        for _ in range(n):
+            jti = f"bench-{uuid4()}"
+            t0 = time.perf_counter()
+            await store.is_revoked(db, jti)
+            results["lookup_miss"].append(time.perf_counter() - t0)
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark revocation backends")
+    parser.add_argument("--backends", nargs="*", default=sorted(revocation_store.STORES))
+    parser.add_argument("-n", type=int, default=1000)
+    parser.add_argument("--with-filter", action="store_true", help="sql: keep the in-process Bloom filter on")
+    args = parser.parse_args()
+
+    settings.REVOCATION_FILTER_ENABLED = args.with_filter
+    revocation_filter.reset()
+    for backend in args.backends:
+        results = await _bench(backend, args.n)
+        print(backend)
+        for op, samples in results.items():
+            print(f"  {op:<12} {_summary(samples)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,37 @@
+# scripts/calibrate_password_hash.py
+"""
+量測本機 bcrypt 速度，建議 BCRYPT_ROUNDS。
+
+  python -m scripts.calibrate_password_hash --target-ms 250
+"""
+import argparse
+
+from app.core.config import settings
+from app.core.security import (
+    BCRYPT_CALIBRATION_MAX_ROUNDS,
+    BCRYPT_CALIBRATION_MIN_ROUNDS,
+    calibrate_bcrypt_rounds,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate bcrypt work factor for this host")
+    parser.add_argument("--target-ms", type=float, default=settings.PASSWORD_HASH_TARGET_MS)
+    parser.add_argument("--min-rounds", type=int, default=BCRYPT_CALIBRATION_MIN_ROUNDS)
+    parser.add_argument("--max-rounds", type=int, default=BCRYPT_CALIBRATION_MAX_ROUNDS)
+    parser.add_argument("--samples", type=int, default=3)
+    args = parser.parse_args()
+
+    rounds, measured = calibrate_bcrypt_rounds(
+        args.target_ms,
+        min_rounds=args.min_rounds,
+        max_rounds=args.max_rounds,
+        samples=args.samples,
+    )
+    for r in sorted(measured):
+        print(f"rounds={r:<3} verify={measured[r]:8.1f} ms")
+    print(f"target={args.target_ms:.0f} ms -> BCRYPT_ROUNDS={rounds}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+# scripts/generate_jwt_key.py
+"""
+產生一把新的 access token 簽章 key，輸出可直接放進 JWT_SIGNING_KEYS 的 JSON 項目。
+
+  python -m scripts.generate_jwt_key --alg ES256 --kid 2026-10
+"""
+import argparse
+import json
+from datetime import datetime, timezone
+
+from app.core.keyring import generate_private_key_pem
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a JWT signing key entry")
+    parser.add_argument("--alg", choices=["ES256", "EdDSA"], default="ES256")
+    parser.add_argument("--kid", default=datetime.now(timezone.utc).strftime("%Y-%m-%d"))
+    args = parser.parse_args()
+
+    entry = {"kid": args.kid, "alg": args.alg, "private_key": generate_private_key_pem(args.alg)}
+    print(json.dumps(entry, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,42 @@
 # scripts/run_cleanup_once.py
+"""
+手動清理 token_blacklist 的過期列（與排程相同的分批引擎）。
+
+  python -m scripts.run_cleanup_once                  # 依 settings.BLACKLIST_PURGE_* 清理
+  python -m scripts.run_cleanup_once --dry-run        # 只計算會刪除多少列
+  python -m scripts.run_cleanup_once --stats          # 只顯示資料表概況
+  python -m scripts.run_cleanup_once --batch-size 5000 --sleep 0 --max-runtime 600
+"""
+import argparse
 import asyncio
+
 from app.db.session import get_db
-from app.services.blacklist_cleanup import cleanup_expired_blacklist
+from app.services.blacklist_cleanup import blacklist_stats, purge_expired_blacklist
+
 
 async def main():
+    parser = argparse.ArgumentParser(description="Purge expired token_blacklist rows")
+    parser.add_argument("--dry-run", action="store_true", help="count expired rows without deleting")
+    parser.add_argument("--stats", action="store_true", help="print table statistics and exit")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--sleep", type=float, default=None, help="seconds to sleep between batches")
+    parser.add_argument("--max-runtime", type=float, default=None, help="stop after this many seconds")
+    args = parser.parse_args()
+
     agen = get_db()
     db = await agen.__anext__()
     try:
-        deleted = await cleanup_expired_blacklist(db)
-        await db.commit()
-        print({"deleted": deleted})
+        if args.stats:
+            print(await blacklist_stats(db))
+            return
+        stats = await purge_expired_blacklist(
+            db,
+            batch_size=args.batch_size,
+            sleep_sec=args.sleep,
+            max_runtime_sec=args.max_runtime,
+            dry_run=args.dry_run,
+        )
+        print(stats.as_dict())
     finally:
         try:
             await agen.aclose()
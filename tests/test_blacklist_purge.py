@@ -0,0 +1,67 @@
+# tests/test_blacklist_purge.py
+import math
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import select
+
+from app.db.session import AsyncSessionLocal
+from app.models.token_blacklist import TokenBlacklist
+from app.services.blacklist_cleanup import PURGE_ROWS, blacklist_stats, purge_expired_blacklist
+
+pytestmark = pytest.mark.anyio
+
+
+async def _insert(session, n: int, expires_at: datetime) -> list:
+    jtis = [f"purge-{uuid4()}" for _ in range(n)]
+    session.add_all(TokenBlacklist(jti=j, token_type="access", expires_at=expires_at) for j in jtis)
+    await session.commit()
+    return jtis
+
+
+async def test_purge_deletes_expired_rows_in_batches():
+    session = AsyncSessionLocal()
+    try:
+        await _insert(session, 25, datetime.utcnow() - timedelta(days=1))
+        live = await _insert(session, 3, datetime.utcnow() + timedelta(hours=1))
+
+        before = await blacklist_stats(session)
+        assert before["expired"] >= 25
+
+        # dry-run：只計數，不刪除
+        dry = await purge_expired_blacklist(session, batch_size=10, sleep_sec=0, dry_run=True)
+        assert dry.deleted == before["expired"]
+        assert (await blacklist_stats(session))["expired"] == before["expired"]
+
+        rows_before = PURGE_ROWS.labels("token_blacklist")._value.get()
+        stats = await purge_expired_blacklist(session, batch_size=10, sleep_sec=0, max_runtime_sec=60)
+        assert stats.complete
+        assert stats.deleted == before["expired"]
+        assert stats.batches == math.ceil(before["expired"] / 10)
+        assert max(stats.batch_sizes) <= 10
+        assert PURGE_ROWS.labels("token_blacklist")._value.get() == rows_before + stats.deleted
+
+        after = await blacklist_stats(session)
+        assert after["expired"] == 0 and after["oldest_expired_at"] is None
+        remaining = (await session.execute(
+            select(TokenBlacklist.jti).where(TokenBlacklist.jti.in_(live))
+        )).scalars().all()
+        assert sorted(remaining) == sorted(live)
+    finally:
+        await session.close()
+
+
+async def test_purge_stops_at_max_runtime():
+    session = AsyncSessionLocal()
+    try:
+        await _insert(session, 25, datetime.utcnow() - timedelta(days=1))
+        stats = await purge_expired_blacklist(session, batch_size=10, sleep_sec=0, max_runtime_sec=0)
+        assert stats.batches == 1 and stats.deleted == 10
+        assert stats.complete is False
+
+        # 下一次執行接續清完
+        rest = await purge_expired_blacklist(session, batch_size=10, sleep_sec=0, max_runtime_sec=60)
+        assert rest.complete and rest.deleted >= 15
+    finally:
+        await session.close()
@@ -0,0 +1,92 @@
+# tests/test_jwks.py
+import json
+
+import pytest
+from httpx import AsyncClient
+from jose import JWTError, jwt as jose_jwt
+
+from app.core import security
+from app.core.config import settings
+from app.core.jwt_backends import AsymmetricKey, _b64encode, peek_header
+from app.core.keyring import generate_private_key_pem
+from cryptography.hazmat.primitives import serialization
+
+
+def _public_pem(private_pem: str, alg: str) -> str:
+    key = AsymmetricKey(private_pem, alg)
+    return key.public.public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ).decode("ascii")
+
+
+@pytest.fixture
+def keyring(monkeypatch, request):
+    backend, active_alg = request.param
+    es_pem = generate_private_key_pem("ES256")
+    ed_pem = generate_private_key_pem("EdDSA")
+    keys = [
+        {"kid": "es-new", "alg": "ES256", "private_key": es_pem},
+        {"kid": "ed-new", "alg": "EdDSA", "private_key": ed_pem},
+        # 輪替下來的舊 key：只留公鑰驗證
+        {"kid": "ed-old", "alg": "EdDSA", "public_key": _public_pem(generate_private_key_pem("EdDSA"), "EdDSA")},
+    ]
+    legacy = security.create_access_token({"sub": "1", "ver": 0})  # 啟用前簽的 HS256 token
+    monkeypatch.setattr(settings, "JWT_SIGNING_KEYS", json.dumps(keys))
+    monkeypatch.setattr(settings, "JWT_ACTIVE_KID", "es-new" if active_alg == "ES256" else "ed-new")
+    security.configure_jwt_backend(backend)
+    security.clear_access_token_cache()
+    yield legacy
+    monkeypatch.undo()
+    security.configure_jwt_backend()
+    security.clear_access_token_cache()
+
+
+@pytest.mark.parametrize(
+    "keyring",
+    [("jose", "ES256"), ("native", "ES256"), ("jose", "EdDSA"), ("native", "EdDSA")],
+    indirect=True,
+)
+def test_asymmetric_access_tokens_with_kid(keyring, monkeypatch):
+    access, refresh = security.issue_token_pair(5, 2)
+    header = peek_header(access)
+    assert header["kid"] in ("es-new", "ed-new")
+    assert security.decode_access_token(access)["sub"] == "5"
+    # refresh 仍是 HS256（只有本服務驗證）
+    assert "kid" not in peek_header(refresh)
+    assert security.decode_refresh_token(refresh)["ver"] == 2
+
+    # 遷移期間舊 HS256 access token 仍可用；關閉後拒絕
+    legacy = keyring
+    assert security.decode_access_token(legacy)["sub"] == "1"
+    monkeypatch.setattr(settings, "JWT_ACCEPT_HS256_ACCESS", False)
+    security.clear_access_token_cache()
+    with pytest.raises(JWTError):
+        security.decode_access_token(legacy)
+
+
+@pytest.mark.parametrize("keyring", [("native", "ES256")], indirect=True)
+def test_unknown_kid_is_rejected(keyring):
+    access = security.create_access_token({"sub": "1", "ver": 0})
+    _, rest = access.split(".", 1)
+    forged_header = peek_header(access)
+    forged_header["kid"] = "missing"
+    forged = _b64encode(json.dumps(forged_header).encode()).decode() + "." + rest
+    with pytest.raises(JWTError):
+        security.decode_access_token(forged)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("keyring", [("jose", "ES256")], indirect=True)
+async def test_jwks_endpoint_allows_edge_verification(keyring, client: AsyncClient):
+    r = await client.get("/.well-known/jwks.json")
+    assert r.status_code == 200
+    assert "max-age" in r.headers.get("Cache-Control", "")
+    keys = {k["kid"]: k for k in r.json()["keys"]}
+    assert set(keys) == {"es-new", "ed-new", "ed-old"}
+    assert all("d" not in k for k in keys.values())  # 不可洩漏私鑰
+
+    # 下游只拿 JWKS 就能在本地驗證 access token
+    access = security.create_access_token({"sub": "9", "ver": 0})
+    claims = jose_jwt.decode(access, keys["es-new"], algorithms=["ES256"])
+    assert claims["sub"] == "9"
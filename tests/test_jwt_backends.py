@@ -0,0 +1,64 @@
+# tests/test_jwt_backends.py
+import time
+
+import pytest
+from jose.exceptions import ExpiredSignatureError, JWTError
+
+from app.core import security
+from app.core.jwt_backends import BACKENDS, get_backend
+
+SECRET = "unit-test-secret"
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def backend(request):
+    return get_backend(request.param)
+
+
+def _claims(**extra):
+    now = int(time.time())
+    claims = {"sub": "1", "ver": 0, "type": "access", "jti": "abc", "iat": now, "exp": now + 60}
+    claims.update(extra)
+    return claims
+
+
+def test_backends_produce_identical_interchangeable_tokens():
+    jose_b, native_b = get_backend("jose"), get_backend("native")
+    claims = _claims()
+    t1 = jose_b.encode(dict(claims), jose_b.load_key(SECRET, "HS256"), "HS256")
+    t2 = native_b.encode(dict(claims), native_b.load_key(SECRET, "HS256"), "HS256")
+    assert t1 == t2
+    assert native_b.decode(t1, native_b.load_key(SECRET, "HS256"), "HS256") == claims
+    assert jose_b.decode(t2, jose_b.load_key(SECRET, "HS256"), "HS256") == claims
+
+
+def test_rejects_bad_signature_expired_and_wrong_alg(backend):
+    key = backend.load_key(SECRET, "HS256")
+    token = backend.encode(_claims(), key, "HS256")
+
+    with pytest.raises(JWTError):
+        backend.decode(token, backend.load_key("other-secret", "HS256"), "HS256")
+    with pytest.raises(JWTError):
+        backend.decode(token[:-2] + ("AA" if not token.endswith("AA") else "BB"), key, "HS256")
+
+    expired = backend.encode(_claims(exp=int(time.time()) - 5), key, "HS256")
+    with pytest.raises(ExpiredSignatureError):
+        backend.decode(expired, key, "HS256")
+
+    hs512 = backend.encode(_claims(), backend.load_key(SECRET, "HS512"), "HS512")
+    with pytest.raises(JWTError):
+        backend.decode(hs512, key, "HS256")
+
+
+@pytest.mark.parametrize("name", sorted(BACKENDS))
+def test_security_roundtrip_with_each_backend(name):
+    try:
+        security.configure_jwt_backend(name)
+        access, refresh = security.issue_token_pair(42, 3)
+        assert security._decode_access_token_uncached(access)["sub"] == "42"
+        assert security.decode_refresh_token(refresh)["ver"] == 3
+        assert security.try_decode_any(refresh)["type"] == "refresh"
+        with pytest.raises(JWTError):
+            security.decode_refresh_token(access)
+    finally:
+        security.configure_jwt_backend()
@@ -0,0 +1,90 @@
+# tests/test_password_pool.py
+import asyncio
+import threading
+import time
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.core.security import hash_password
+from app.db.session import AsyncSessionLocal
+from app.models.users import User
+from app.services.password_pool import PasswordHashBusy, PasswordHashPool
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_pool_sheds_when_queue_is_full():
+    pool = PasswordHashPool(workers=1, max_queue=0, retry_after=3)
+    gate = threading.Event()
+    try:
+        first = asyncio.ensure_future(pool.run("hash", gate.wait, 5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(PasswordHashBusy) as ei:
+            await pool.run("hash", lambda: "x")
+        assert ei.value.retry_after == 3
+        gate.set()
+        assert await first is True
+        assert pool.pending == 0
+    finally:
+        gate.set()
+        pool.shutdown()
+
+
+async def test_login_returns_503_when_pool_busy(client: AsyncClient, monkeypatch):
+    async def _busy(*args, **kwargs):
+        raise PasswordHashBusy(2)
+
+    monkeypatch.setattr("app.api.v1.endpoints.auth.verify_password_async", _busy, raising=True)
+    await _ensure_user("pool@example.com", "PoolPass123")
+    r = await client.post(
+        "/api/v1/auth/login",
+        data={"username": "pool@example.com", "password": "PoolPass123"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert r.status_code == 503
+    assert r.headers.get("Retry-After") == "2"
+
+
+async def _ensure_user(email: str, password: str) -> None:
+    session = AsyncSessionLocal()
+    try:
+        res = await session.execute(select(User).where(User.email == email))
+        if res.scalar_one_or_none() is None:
+            session.add(User(email=email, name="Pool", password_hash=hash_password(password), token_version=0))
+            await session.commit()
+    finally:
+        await session.close()
+
+
+async def test_healthz_latency_stays_flat_during_login_burst(client: AsyncClient):
+    email, password = "pool@example.com", "PoolPass123"
+    await _ensure_user(email, password)
+
+    # 單次 bcrypt 驗證的時間；若 event loop 被卡住，/healthz 至少會慢這麼多
+    t0 = time.perf_counter()
+    hash_password(password)
+    one_hash = time.perf_counter() - t0
+
+    async def _login():
+        return await client.post(
+            "/api/v1/auth/login",
+            data={"username": email, "password": password},
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+
+    logins = [asyncio.ensure_future(_login()) for _ in range(6)]
+    latencies = []
+    while not all(t.done() for t in logins):
+        # 量整個迴圈（含 sleep）：event loop 任何時候被卡住都會反映在這裡
+        t = time.perf_counter()
+        r = await client.get("/healthz")
+        assert r.status_code == 200
+        await asyncio.sleep(0.01)
+        latencies.append(time.perf_counter() - t - 0.01)
+
+    results = await asyncio.gather(*logins)
+    assert all(r.status_code == 200 for r in results)
+    assert latencies
+    assert max(latencies) < one_hash
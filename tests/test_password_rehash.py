@@ -0,0 +1,64 @@
+# tests/test_password_rehash.py
+import pytest
+from httpx import AsyncClient
+from passlib.hash import bcrypt as bcrypt_handler
+from sqlalchemy import select
+
+from app.core.security import (
+    calibrate_bcrypt_rounds,
+    configure_password_hashing,
+    current_bcrypt_rounds,
+    password_needs_rehash,
+)
+from app.db.session import AsyncSessionLocal
+from app.models.users import User
+
+pytestmark = pytest.mark.anyio
+
+
+def test_calibration_respects_bounds():
+    rounds, measured = calibrate_bcrypt_rounds(target_ms=0.0001, min_rounds=4, max_rounds=6, samples=1)
+    assert rounds == 4
+    assert 4 in measured
+
+    rounds, _ = calibrate_bcrypt_rounds(target_ms=10_000, min_rounds=4, max_rounds=6, samples=1)
+    assert rounds == 6
+
+
+async def test_login_upgrades_outdated_hash(client: AsyncClient):
+    email, password = "rehash@example.com", "RehashPass123"
+    session = AsyncSessionLocal()
+    try:
+        res = await session.execute(select(User).where(User.email == email))
+        if res.scalar_one_or_none() is None:
+            session.add(User(
+                email=email,
+                name="Rehash",
+                password_hash=bcrypt_handler.using(rounds=4, ident="2b").hash(password),
+                token_version=0,
+            ))
+            await session.commit()
+    finally:
+        await session.close()
+
+    configure_password_hashing(5)
+    try:
+        assert current_bcrypt_rounds() == 5
+        r = await client.post(
+            "/api/v1/auth/login",
+            data={"username": email, "password": password},
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        assert r.status_code == 200, r.text
+
+        session = AsyncSessionLocal()
+        try:
+            res = await session.execute(select(User.password_hash).where(User.email == email))
+            new_hash = res.scalar_one()
+        finally:
+            await session.close()
+        assert new_hash.startswith("$2b$05$")
+        assert not password_needs_rehash(new_hash)
+    finally:
+        configure_password_hashing(None)
+    assert not password_needs_rehash(new_hash)
@@ -0,0 +1,111 @@
+# tests/test_rate_limit_gcra.py
+import random
+
+import fakeredis
+import pytest
+
+from app.services import rate_limit
+from app.services.rate_limit import gcra_decide
+
+WINDOW, LIMIT = 60.0, 5
+
+
+def test_gcra_allows_exactly_one_burst_then_refills():
+    tat, now = None, 1000.0
+    allowed = 0
+    for _ in range(LIMIT + 3):
+        ok, retry, tat = gcra_decide(tat, now, WINDOW, LIMIT)
+        allowed += ok
+    assert allowed == LIMIT
+    assert retry == pytest.approx(WINDOW / LIMIT)  # 下一格在 window/limit 秒後補上
+
+    ok, _, tat = gcra_decide(tat, now + retry, WINDOW, LIMIT)
+    assert ok
+    ok, _, _ = gcra_decide(tat, now + retry, WINDOW, LIMIT)
+    assert not ok
+
+
+def test_gcra_rejection_does_not_consume_budget():
+    tat = None
+    for _ in range(LIMIT):
+        _, _, tat = gcra_decide(tat, 0.0, WINDOW, LIMIT)
+    before = tat
+    for _ in range(100):
+        ok, _, tat = gcra_decide(tat, 0.0, WINDOW, LIMIT)
+        assert not ok
+    assert tat == before
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    r = fakeredis.FakeAsyncRedis(decode_responses=True)
+    clock = {"now": 10_000.0}
+    monkeypatch.setattr(rate_limit, "_enabled", lambda: True)
+    monkeypatch.setattr(rate_limit, "_get_redis", lambda: r)
+    monkeypatch.setattr(rate_limit, "_scripting_available", True)
+    monkeypatch.setattr(rate_limit, "_gcra_lua", None)
+    monkeypatch.setattr(rate_limit, "_sliding_window_lua", None)
+    monkeypatch.setattr(rate_limit, "WINDOW_SEC", int(WINDOW))
+    monkeypatch.setattr(rate_limit, "MAX_PER_IP", LIMIT)
+    monkeypatch.setattr(rate_limit, "MAX_PER_EMAIL_IP", LIMIT)
+    monkeypatch.setattr(rate_limit.time, "time", lambda: clock["now"])
+    r.clock = clock
+    return r
+
+
+async def _attack(algorithm: str, r, ip: str, seconds: int, per_second: int, monkeypatch) -> int:
+    """固定速率的攻擊流量，回傳被放行的次數。"""
+    monkeypatch.setattr(rate_limit, "ALGORITHM", algorithm)
+    start = r.clock["now"]
+    admitted = 0
+    for tick in range(seconds * per_second):
+        r.clock["now"] = start + tick / per_second
+        ok, retry_after = await rate_limit.check_limit_and_hit(ip, None)
+        admitted += ok
+        assert ok or 1 <= retry_after <= WINDOW
+    r.clock["now"] = start
+    return admitted
+
+
+@pytest.mark.anyio
+async def test_gcra_and_sliding_window_enforce_equivalent_limits(fake_redis, monkeypatch):
+    # 同樣的 burst 上限
+    assert await _attack("gcra", fake_redis, "burst-g", 1, 50, monkeypatch) == LIMIT
+    assert await _attack("sliding_window", fake_redis, "burst-s", 1, 50, monkeypatch) == LIMIT
+
+    # 長時間的持續攻擊：兩者都收斂到 limit / window，差距不超過一個 burst
+    hours = 3600
+    gcra = await _attack("gcra", fake_redis, "long-g", hours, 2, monkeypatch)
+    window = await _attack("sliding_window", fake_redis, "long-s", hours, 2, monkeypatch)
+    expected = LIMIT * hours / WINDOW
+    assert abs(gcra - expected) <= LIMIT
+    assert abs(window - expected) <= LIMIT
+    assert abs(gcra - window) <= LIMIT
+
+
+@pytest.mark.anyio
+async def test_gcra_lua_matches_reference_and_uses_one_small_key(fake_redis, monkeypatch):
+    monkeypatch.setattr(rate_limit, "ALGORITHM", "gcra")
+    rng = random.Random(7)
+    tat = None
+    for _ in range(300):
+        fake_redis.clock["now"] += rng.choice([0.0, 0.5, 3.0, 15.0])
+        expected_ok, expected_retry, tat = gcra_decide(tat, fake_redis.clock["now"], WINDOW, LIMIT)
+        ok, retry_after = await rate_limit.check_limit_and_hit("ref", None)
+        assert ok == expected_ok
+        if not ok:
+            assert retry_after == rate_limit._retry_seconds(expected_retry)
+
+    keys = await fake_redis.keys("*")
+    assert keys == [rate_limit._tat_key(rate_limit._key_ip("ref"))]
+    assert await fake_redis.type(keys[0]) == "string"
+    assert 0 < await fake_redis.pttl(keys[0]) <= WINDOW * 1000
+
+
+@pytest.mark.anyio
+async def test_gcra_watch_fallback_matches_script(fake_redis, monkeypatch):
+    monkeypatch.setattr(rate_limit, "ALGORITHM", "gcra")
+    monkeypatch.setattr(rate_limit, "_scripting_available", False)
+    results = [await rate_limit.check_limit_and_hit("w", "w@example.com") for _ in range(LIMIT + 1)]
+    assert [ok for ok, _ in results] == [True] * LIMIT + [False]
+    assert results[-1][1] == int(WINDOW / LIMIT)
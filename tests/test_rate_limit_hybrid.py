@@ -0,0 +1,96 @@
+# tests/test_rate_limit_hybrid.py
+import fakeredis
+import pytest
+
+from app.services import rate_limit
+from app.services.rate_limit_hybrid import HYBRID_DECISIONS, HybridLimiter
+
+WINDOW, LIMIT = 60.0, 50
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    r = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(rate_limit, "_scripting_available", True)
+    monkeypatch.setattr(rate_limit, "_sliding_window_lua", None)
+    monkeypatch.setattr(rate_limit, "WINDOW_SEC", int(WINDOW))
+    return r
+
+
+def _decisions(path: str) -> float:
+    return HYBRID_DECISIONS.labels(path)._value.get()
+
+
+async def _hit(limiter: HybridLimiter, r, key: str, now: float, limit: int = LIMIT):
+    return await limiter.check(r, [(key, limit)], now, WINDOW, exact=rate_limit._sliding_window)
+
+
+@pytest.mark.anyio
+async def test_far_below_limit_never_touches_redis(fake_redis):
+    limiter = HybridLimiter(sync_interval=10.0, error=0.1)
+    await limiter.sync(fake_redis, now=1000.0, window=WINDOW)  # 之後 10 秒內不會順便同步
+    redis_before = _decisions("redis")
+
+    # margin = 5：同步前本 worker 最多先放行 5 次，第 6 次起問 Redis
+    results = [await _hit(limiter, fake_redis, "rl:h:quiet", 1000.0 + i * 0.1) for i in range(5)]
+    assert results == [(True, 0, LIMIT - 1 - i) for i in range(5)]
+    assert _decisions("redis") == redis_before
+    assert not await fake_redis.exists("rl:h:quiet")
+
+    await limiter.sync(fake_redis, now=1001.0, window=WINDOW)
+    assert await fake_redis.zcard("rl:h:quiet") == 5  # delta 以 sorted-set 成員寫入，與 sliding window 同格式
+    assert await fake_redis.ttl("rl:h:quiet") > 0
+
+
+@pytest.mark.anyio
+async def test_zero_error_is_exactly_the_sliding_window(fake_redis):
+    limiter = HybridLimiter(sync_interval=0.25, error=0.0)
+    local_before = _decisions("local_allow")
+    results = [await _hit(limiter, fake_redis, "rl:h:exact", 1000.0 + i * 0.01) for i in range(LIMIT + 10)]
+    assert [ok for ok, _, _ in results] == [True] * LIMIT + [False] * 10
+    assert _decisions("local_allow") == local_before
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("error", [0.0, 0.1, 0.2])
+async def test_global_overshoot_is_bounded_by_workers_times_margin(fake_redis, error):
+    workers = [HybridLimiter(sync_interval=0.25, error=error) for _ in range(3)]
+    key = f"rl:h:cluster:{error}"
+    admitted = 0
+    for i in range(600):  # 6 秒內 600 次嘗試，輪流打到 3 個 worker（遠小於 window）
+        ok, retry_after, _ = await _hit(workers[i % 3], fake_redis, key, 1000.0 + i * 0.01)
+        admitted += ok
+        assert ok or 1 <= retry_after <= WINDOW
+    for w in workers:
+        await w.sync(fake_redis, now=1006.0, window=WINDOW)
+
+    bound = LIMIT + len(workers) * workers[0].margin(LIMIT)
+    assert LIMIT <= admitted <= bound
+    assert await fake_redis.zcard(key) == admitted  # 每次放行最後都有記到 Redis
+
+
+@pytest.mark.anyio
+async def test_saturated_key_is_denied_locally_until_oldest_expires(fake_redis):
+    limiter = HybridLimiter(sync_interval=0.25, error=0.1)
+    for i in range(LIMIT):
+        assert (await _hit(limiter, fake_redis, "rl:h:full", 1000.0 + i * 0.01))[0]
+    await limiter.sync(fake_redis, now=1001.0, window=WINDOW)
+
+    deny_before, redis_before = _decisions("local_deny"), _decisions("redis")
+    ok, retry_after, remaining = await _hit(limiter, fake_redis, "rl:h:full", 1001.1)
+    assert not ok and retry_after == 59 and remaining == 0
+    assert _decisions("local_deny") == deny_before + 1
+    assert _decisions("redis") == redis_before
+
+    # 最舊的嘗試滑出視窗後又可以放行
+    ok, _, _ = await _hit(limiter, fake_redis, "rl:h:full", 1060.5)
+    assert ok
+
+
+@pytest.mark.anyio
+async def test_forget_drops_local_state(fake_redis):
+    limiter = HybridLimiter(sync_interval=10.0, error=0.1)
+    await _hit(limiter, fake_redis, "rl:h:reset", 1000.0)
+    assert len(limiter) == 1
+    limiter.forget("rl:h:reset")
+    assert len(limiter) == 0
@@ -0,0 +1,112 @@
+# tests/test_rate_limit_policy.py
+import base64
+from uuid import uuid4
+
+import fakeredis
+import pytest
+from httpx import AsyncClient
+
+from app.core.security import create_access_token
+from app.services import rate_limit, rate_limit_policy
+from app.services.rate_limit_policy import RATE_LIMIT_REJECTIONS, RateLimitPolicy
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["sliding_window", "gcra"])
+def limited(request, monkeypatch):
+    r = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(rate_limit, "_enabled", lambda: True)
+    monkeypatch.setattr(rate_limit, "_get_redis", lambda: r)
+    monkeypatch.setattr(rate_limit, "_scripting_available", True)
+    monkeypatch.setattr(rate_limit, "_sliding_window_lua", None)
+    monkeypatch.setattr(rate_limit, "_gcra_lua", None)
+    monkeypatch.setattr(rate_limit, "ALGORITHM", request.param)
+    monkeypatch.setattr(rate_limit.time, "time", lambda: 5000.0)  # 固定時間：GCRA 不會在測試中補格
+    policies = dict(rate_limit_policy.POLICIES)
+    policies["api"] = RateLimitPolicy("api", limit=12, window=60, key="auto")
+    policies["signup"] = RateLimitPolicy("signup", limit=2, window=3600, key="ip")
+    monkeypatch.setattr(rate_limit_policy, "POLICIES", policies)
+    return r
+
+
+def _rejections(policy: str) -> float:
+    return RATE_LIMIT_REJECTIONS.labels(policy)._value.get()
+
+
+async def _match(client: AsyncClient, headers=None):
+    return await client.post("/api/v1/nutrition/match", json={"label": "雞胸肉", "grams": 100}, headers=headers or {})
+
+
+async def test_cost_weight_consumes_shared_budget(client: AsyncClient, limited):
+    # /nutrition/match 每次 5 單位 → 12 單位的預算只夠兩次
+    r = await _match(client)
+    assert r.status_code == 200, r.text
+    assert r.headers["RateLimit-Limit"] == "12"
+    assert r.headers["RateLimit-Remaining"] == "7"
+    assert r.headers["RateLimit-Policy"] == "12;w=60"
+    assert (await _match(client)).headers["RateLimit-Remaining"] == "2"
+
+    before = _rejections("api")
+    r = await _match(client)
+    assert r.status_code == 429
+    assert 1 <= int(r.headers["Retry-After"]) <= 60
+    assert r.headers["RateLimit-Remaining"] == "2"
+    assert _rejections("api") == before + 1
+
+    # vision 至少 10 單位，同一份預算已不夠
+    img = base64.b64encode(b"\x89PNG\r\n\x1a\n").decode()
+    assert (await client.post("/api/v1/vision/analyze", json={"image_b64": img})).status_code == 429
+
+
+async def test_vision_cost_scales_with_payload_size(client: AsyncClient, limited, monkeypatch):
+    policies = dict(rate_limit_policy.POLICIES)
+    policies["api"] = RateLimitPolicy("api", limit=100, window=60, key="auto")
+    monkeypatch.setattr(rate_limit_policy, "POLICIES", policies)
+
+    small = base64.b64encode(b"x" * 10).decode()
+    r = await client.post("/api/v1/vision/analyze", json={"image_b64": small})
+    assert r.status_code == 200 and r.headers["RateLimit-Remaining"] == "90"
+
+    big = base64.b64encode(b"x" * (600 * 1024)).decode()  # ~800 KiB base64 → 10 + 3
+    r = await client.post("/api/v1/vision/analyze", json={"image_b64": big})
+    assert r.status_code == 200 and r.headers["RateLimit-Remaining"] == "77"
+
+
+async def test_users_and_api_keys_get_their_own_budget(client: AsyncClient, limited, monkeypatch):
+    alice = {"Authorization": f"Bearer {create_access_token({'sub': '101', 'ver': 0})}"}
+    bob = {"Authorization": f"Bearer {create_access_token({'sub': '102', 'ver': 0})}"}
+    for _ in range(2):
+        assert (await _match(client, alice)).status_code == 200
+    assert (await _match(client, alice)).status_code == 429
+    assert (await _match(client, bob)).status_code == 200
+    # 偽造的 token 不會拿到 bob 的預算，而是退回 IP
+    assert (await _match(client, {"Authorization": "Bearer forged"})).headers["RateLimit-Remaining"] == "7"
+
+    monkeypatch.setattr(rate_limit_policy, "_API_KEYS", frozenset({"partner-key"}))
+    partner = {"X-API-Key": "partner-key", **alice}  # api key 優先於 user
+    assert (await _match(client, partner)).headers["RateLimit-Remaining"] == "7"
+    unknown = {"X-API-Key": "random-key", **alice}  # 未登記的 key 不算數 → alice 已用完
+    assert (await _match(client, unknown)).status_code == 429
+
+    keys = await limited.keys("rl:api:*")
+    assert not any("partner-key" in k for k in keys)
+
+
+async def test_signup_is_limited_per_ip(client: AsyncClient, limited):
+    before = _rejections("signup")
+    codes = []
+    for _ in range(3):
+        r = await client.post(
+            "/api/v1/users/",
+            json={"email": f"signup-{uuid4().hex[:8]}@example.com", "name": "S", "password": "Secret123!"},
+        )
+        codes.append(r.status_code)
+    assert codes == [201, 201, 429]
+    assert _rejections("signup") == before + 1
+
+
+async def test_disabled_limiter_still_passes_requests(client: AsyncClient):
+    r = await _match(client)
+    assert r.status_code == 200
+    assert r.headers["RateLimit-Remaining"] == str(rate_limit_policy.POLICIES["api"].limit)
@@ -0,0 +1,63 @@
+# tests/test_rate_limit_script.py
+import asyncio
+
+import fakeredis
+import pytest
+from redis.exceptions import ResponseError
+
+from app.services import rate_limit
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["script", "pipeline"])
+def fake_redis(request, monkeypatch):
+    r = fakeredis.FakeAsyncRedis(decode_responses=True)
+    if request.param == "pipeline":
+        async def _no_scripting(*args, **kwargs):
+            raise ResponseError("unknown command 'evalsha'")
+        monkeypatch.setattr(r, "evalsha", _no_scripting)
+        monkeypatch.setattr(r, "eval", _no_scripting)
+
+    monkeypatch.setattr(rate_limit, "_enabled", lambda: True)
+    monkeypatch.setattr(rate_limit, "_get_redis", lambda: r)
+    monkeypatch.setattr(rate_limit, "_scripting_available", True)
+    monkeypatch.setattr(rate_limit, "_sliding_window_lua", None)
+    monkeypatch.setattr(rate_limit, "MAX_PER_IP", 5)
+    monkeypatch.setattr(rate_limit, "MAX_PER_EMAIL_IP", 3)
+    monkeypatch.setattr(rate_limit, "WINDOW_SEC", 60)
+    return r
+
+
+async def test_both_dimensions_enforced_in_one_call(fake_redis, monkeypatch):
+    monkeypatch.setattr(rate_limit.time, "time", lambda: 1000.0)  # 同一時間點的嘗試也要分別計數
+
+    results = [await rate_limit.check_limit_and_hit("1.1.1.1", "a@example.com") for _ in range(4)]
+    assert [ok for ok, _ in results] == [True, True, True, False]
+    assert results[-1][1] == 60
+    # 被拒絕的那次不會記錄
+    assert await fake_redis.zcard(rate_limit._key_email_ip("a@example.com", "1.1.1.1")) == 3
+    assert 0 < await fake_redis.ttl(rate_limit._key_ip("1.1.1.1")) <= 60
+
+    # 另一個 email 仍受 IP 維度限制（5 次）
+    assert (await rate_limit.check_limit_and_hit("1.1.1.1", "b@example.com"))[0] is True
+    assert (await rate_limit.check_limit_and_hit("1.1.1.1", "b@example.com"))[0] is True
+    ok, retry_after = await rate_limit.check_limit_and_hit("1.1.1.1", "c@example.com")
+    assert ok is False and retry_after == 60
+
+    # 視窗滑過後恢復
+    monkeypatch.setattr(rate_limit.time, "time", lambda: 1061.0)
+    assert (await rate_limit.check_limit_and_hit("1.1.1.1", "a@example.com"))[0] is True
+
+
+async def test_concurrent_attempts_never_exceed_limit(fake_redis, request):
+    if request.node.callspec.params["fake_redis"] == "pipeline":
+        pytest.skip("pipeline fallback is documented as slightly over-admitting under concurrency")
+    results = await asyncio.gather(*(rate_limit.check_limit_and_hit("2.2.2.2", None) for _ in range(20)))
+    assert sum(ok for ok, _ in results) == 5
+
+
+async def test_scripting_failure_switches_to_pipeline(fake_redis, request):
+    await rate_limit.check_limit_and_hit("3.3.3.3", "x@example.com")
+    expected = request.node.callspec.params["fake_redis"] == "script"
+    assert rate_limit._scripting_available is expected
@@ -0,0 +1,143 @@
+# tests/test_redis_client.py
+import asyncio
+import time
+from uuid import uuid4
+
+import fakeredis
+import pytest
+from fakeredis._clients._async import FakeAsyncRedisConnection
+from httpx import AsyncClient
+from prometheus_client import REGISTRY
+from redis.asyncio import ConnectionPool
+from redis.exceptions import ResponseError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from app.core.redis_client import CircuitBreaker, CircuitOpenError, create_redis
+from app.services import rate_limit, rate_limit_policy
+from app.services.rate_limit_policy import RateLimitPolicy
+
+pytestmark = pytest.mark.anyio
+
+
+class _SlowConnection(FakeAsyncRedisConnection):
+    """每次送出前 sleep delay，模擬卡住的 Redis；sent 記錄實際送出的次數。"""
+
+    delay: float = 0.0
+    sent: int = 0
+
+    async def send_packed_command(self, command, check_health=True):
+        type(self).sent += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return await super().send_packed_command(command, check_health)
+
+
+@pytest.fixture
+def slow_redis():
+    conn = type("Conn", (_SlowConnection,), {"delay": 0.0, "sent": 0})
+    pool = ConnectionPool(connection_class=conn, server=fakeredis.FakeServer(), decode_responses=True)
+    name = f"test-{uuid4().hex[:6]}"
+    client = create_redis(name=name, connection_pool=pool, command_timeout=0.05, breaker_failures=3, breaker_reset=0.1)
+    client.conn = conn
+    return client
+
+
+def _sample(metric: str, **labels) -> float:
+    return REGISTRY.get_sample_value(metric, labels) or 0.0
+
+
+async def _trip(client) -> None:
+    client.conn.delay = 0.2
+    for _ in range(3):
+        with pytest.raises(RedisTimeoutError):
+            await client.get("k")
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+
+async def test_commands_and_pipelines_are_timed(slow_redis):
+    name = slow_redis.breaker.name
+    await slow_redis.set("k", "v")
+    assert await slow_redis.get("k") == "v"
+    async with slow_redis.pipeline(transaction=True) as pipe:
+        pipe.incr("n").incr("n")
+        assert await pipe.execute() == [1, 2]
+
+    assert _sample("redis_command_duration_seconds_count", client=name, command="SET") == 1
+    assert _sample("redis_command_duration_seconds_count", client=name, command="GET") == 1
+    assert _sample("redis_command_duration_seconds_count", client=name, command="MULTI") == 1
+    assert _sample("redis_breaker_state", client=name) == 0
+
+
+async def test_stalled_redis_times_out_and_opens_breaker(slow_redis):
+    name = slow_redis.breaker.name
+    started = time.perf_counter()
+    await _trip(slow_redis)
+    assert time.perf_counter() - started < 0.5  # 每次最多等 command_timeout，不是 delay
+    assert _sample("redis_breaker_state", client=name) == 2
+    assert _sample("redis_command_errors_total", client=name, error="timeout") == 3
+
+    # open 期間不碰網路
+    sent = slow_redis.conn.sent
+    with pytest.raises(CircuitOpenError):
+        await slow_redis.get("k")
+    with pytest.raises(CircuitOpenError):
+        async with slow_redis.pipeline() as pipe:
+            await pipe.get("k").execute()
+    assert slow_redis.conn.sent == sent
+
+
+async def test_half_open_probe_closes_or_reopens(slow_redis):
+    await _trip(slow_redis)
+
+    # 探測失敗 → 立刻再打開
+    await asyncio.sleep(0.12)
+    with pytest.raises(RedisTimeoutError):
+        await slow_redis.get("k")
+    assert slow_redis.breaker.state == CircuitBreaker.OPEN
+
+    # Redis 恢復後，探測成功 → closed
+    slow_redis.conn.delay = 0.0
+    await asyncio.sleep(0.12)
+    assert await slow_redis.set("k", "v")
+    assert slow_redis.breaker.state == CircuitBreaker.CLOSED
+    assert _sample("redis_breaker_state", client=slow_redis.breaker.name) == 0
+
+
+async def test_response_errors_do_not_trip_the_breaker(slow_redis):
+    await slow_redis.set("s", "not-a-list")
+    for _ in range(5):
+        with pytest.raises(ResponseError):
+            await slow_redis.lpush("s", 1)
+    assert slow_redis.breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.fixture
+def limiter_on_broken_redis(slow_redis, monkeypatch):
+    monkeypatch.setattr(rate_limit, "_enabled", lambda: True)
+    monkeypatch.setattr(rate_limit, "_get_redis", lambda: slow_redis)
+    monkeypatch.setattr(rate_limit, "_sliding_window_lua", None)
+    monkeypatch.setattr(rate_limit, "local_limiter", rate_limit.LocalLimiter(max_keys=100))
+    monkeypatch.setattr(rate_limit, "MAX_PER_IP", 3)
+    return slow_redis
+
+
+async def test_login_limiter_falls_back_to_local_limits(limiter_on_broken_redis):
+    await _trip(limiter_on_broken_redis)
+    before = _sample("rate_limit_failover_total", policy="login", mode="local")
+
+    results = [await rate_limit.check_limit_and_hit("9.9.9.9", None) for _ in range(4)]
+    assert [ok for ok, _ in results] == [True, True, True, False]
+    assert results[-1][1] >= 1
+    assert _sample("rate_limit_failover_total", policy="login", mode="local") == before + 4
+
+
+async def test_policy_failover_open_passes_requests(client: AsyncClient, limiter_on_broken_redis, monkeypatch):
+    policies = dict(rate_limit_policy.POLICIES)
+    policies["api"] = RateLimitPolicy("api", limit=6, window=60, key="auto", failover="open")
+    monkeypatch.setattr(rate_limit_policy, "POLICIES", policies)
+    await _trip(limiter_on_broken_redis)
+
+    for _ in range(3):  # cost 5 × 3 > 6，但 Redis 不可用時 fail open
+        r = await client.post("/api/v1/nutrition/match", json={"label": "rice", "grams": 100})
+        assert r.status_code == 200
+        assert r.headers["RateLimit-Remaining"] == "6"
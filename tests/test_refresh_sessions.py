@@ -0,0 +1,127 @@
+# tests/test_refresh_sessions.py
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+
+from app.core.jwt_backends import peek_claims
+from app.core.security import create_refresh_token, hash_password
+from app.db.session import AsyncSessionLocal
+from app.models.refresh_session import RefreshSession
+from app.models.token_blacklist import TokenBlacklist
+from app.models.users import User
+
+pytestmark = pytest.mark.anyio
+
+PASSWORD = "Secret123!"
+
+
+async def _new_user() -> User:
+    session = AsyncSessionLocal()
+    try:
+        user = User(
+            email=f"fam-{uuid4().hex[:8]}@example.com",
+            name="Fam",
+            password_hash=hash_password(PASSWORD),
+            token_version=0,
+        )
+        session.add(user)
+        await session.commit()
+        return user
+    finally:
+        await session.close()
+
+
+async def _login(client: AsyncClient, user: User, agent: str = "pytest"):
+    r = await client.post(
+        "/api/v1/auth/login",
+        data={"username": user.email, "password": PASSWORD},
+        headers={"User-Agent": agent},
+    )
+    assert r.status_code == 200, r.text
+    return r.json()["access_token"], r.json()["refresh_token"]
+
+
+async def _refresh(client: AsyncClient, token: str):
+    return await client.post("/api/v1/auth/refresh", json={"refresh_token": token})
+
+
+async def _scalar(q):
+    session = AsyncSessionLocal()
+    try:
+        return (await session.execute(q)).scalar()
+    finally:
+        await session.close()
+
+
+async def test_rotation_is_constant_size_and_replay_revokes_family(client: AsyncClient):
+    user = await _new_user()
+    _, r0 = await _login(client, user)
+    family = peek_claims(r0)["fam"]
+    assert peek_claims(r0)["gen"] == 0
+
+    r = await _refresh(client, r0)
+    assert r.status_code == 200, r.text
+    r1 = r.json()["refresh_token"]
+    r = await _refresh(client, r1)
+    assert r.status_code == 200, r.text
+    r2 = r.json()["refresh_token"]
+    assert (peek_claims(r2)["fam"], peek_claims(r2)["gen"]) == (family, 2)
+
+    # 輪替只更新 family 列，不再寫 token_blacklist
+    assert await _scalar(select(RefreshSession.generation).where(RefreshSession.id == family)) == 2
+    assert await _scalar(
+        select(func.count(TokenBlacklist.id)).where(TokenBlacklist.user_id == user.id)
+    ) == 0
+
+    # 重放舊 generation → 整個 family 撤銷，連最新的 r2 也不能用
+    r = await _refresh(client, r1)
+    assert r.status_code == 401
+    assert "reuse" in r.json()["detail"]
+    assert (await _refresh(client, r2)).status_code == 401
+    assert await _scalar(select(RefreshSession.revoked_reason).where(RefreshSession.id == family)) == "replay"
+
+
+async def test_list_and_revoke_devices(client: AsyncClient):
+    user = await _new_user()
+    phone_access, phone_refresh = await _login(client, user, agent="phone")
+    laptop_access, _ = await _login(client, user, agent="laptop")
+    headers = {"Authorization": f"Bearer {laptop_access}"}
+
+    r = await client.get("/api/v1/auth/sessions", headers=headers)
+    assert r.status_code == 200, r.text
+    sessions = {s["user_agent"]: s for s in r.json()}
+    assert set(sessions) == {"phone", "laptop"}
+    assert sessions["laptop"]["current"] and not sessions["phone"]["current"]
+
+    phone_id = sessions["phone"]["id"]
+    r = await client.delete(f"/api/v1/auth/sessions/{phone_id}", headers=headers)
+    assert r.status_code == 200, r.text
+    assert (await _refresh(client, phone_refresh)).status_code == 401
+    assert (await client.delete(f"/api/v1/auth/sessions/{phone_id}", headers=headers)).status_code == 404
+
+    r = await client.get("/api/v1/auth/sessions", headers=headers)
+    assert [s["user_agent"] for s in r.json()] == ["laptop"]
+
+    # logout 帶 refresh → 該 family 撤銷
+    _, laptop2_refresh = await _login(client, user, agent="laptop-2")
+    r = await client.post(
+        "/api/v1/auth/logout",
+        headers={"Authorization": f"Bearer {phone_access}"},
+        json={"refresh_token": laptop2_refresh},
+    )
+    assert r.status_code == 200, r.text
+    assert (await _refresh(client, laptop2_refresh)).status_code == 401
+
+
+async def test_legacy_refresh_token_migrates_to_family_once(client: AsyncClient):
+    user = await _new_user()
+    legacy = create_refresh_token({"sub": str(user.id), "ver": 0})  # 升級前簽發（無 fam）
+
+    r = await _refresh(client, legacy)
+    assert r.status_code == 200, r.text
+    assert peek_claims(r.json()["refresh_token"])["gen"] == 0
+
+    # 舊 token 已黑名單化，不能再換一次
+    assert (await _refresh(client, legacy)).status_code == 401
@@ -0,0 +1,69 @@
+# tests/test_revocation_filter.py
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+
+from app.db.session import AsyncSessionLocal
+from app.models.token_blacklist import TokenBlacklist
+from app.services.revocation_filter import FILTER_CHECKS, BloomFilter, RevocationFilter
+
+pytestmark = pytest.mark.anyio
+
+
+def _checks(result: str) -> float:
+    return FILTER_CHECKS.labels(result)._value.get()
+
+
+def test_bloom_has_no_false_negatives():
+    bf = BloomFilter(capacity=1000, error_rate=0.01)
+    items = [str(uuid4()) for _ in range(1000)]
+    for it in items:
+        bf.add(it)
+    assert all(it in bf for it in items)
+
+    # 誤判率應落在設定值附近（給寬鬆上限避免偶發失敗）
+    others = [str(uuid4()) for _ in range(5000)]
+    fp = sum(1 for it in others if it in bf)
+    assert fp / len(others) < 0.05
+
+
+async def test_filter_negative_skips_db_and_sees_other_workers():
+    f = RevocationFilter(capacity=1000, error_rate=0.001, recent_max=100, sync_interval=60, rebuild_interval=3600)
+    session = AsyncSessionLocal()
+    try:
+        # 第一次：全量載入後，未撤銷的 jti 直接由 Bloom 否定
+        before = _checks("negative")
+        assert await f.is_revoked(session, str(uuid4())) is False
+        assert _checks("negative") == before + 1
+
+        # 本 worker 撤銷：立即生效（不需等待同步）
+        local_jti = str(uuid4())
+        f.add(local_jti, datetime.utcnow() + timedelta(minutes=5))
+        assert await f.is_revoked(session, local_jti) is True
+
+        # 模擬其它 worker 寫入黑名單：強制增量同步後可見
+        other_jti = str(uuid4())
+        session.add(TokenBlacklist(
+            jti=other_jti,
+            token_type="access",
+            expires_at=datetime.utcnow() + timedelta(minutes=5),
+        ))
+        await session.commit()
+        await f.sync(session, force=True)
+        assert await f.is_revoked(session, other_jti) is True
+    finally:
+        await session.close()
+
+
+async def test_expired_recent_entries_are_ignored():
+    f = RevocationFilter(capacity=100, error_rate=0.001, recent_max=10, sync_interval=60, rebuild_interval=3600)
+    session = AsyncSessionLocal()
+    try:
+        await f.sync(session, force=True)
+        jti = str(uuid4())
+        f.add(jti, datetime.utcnow() - timedelta(seconds=1))
+        # recent 內已過期 → 交給 Bloom + DB（DB 沒有這筆）→ 未撤銷
+        assert await f.is_revoked(session, jti) is False
+    finally:
+        await session.close()
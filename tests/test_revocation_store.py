@@ -0,0 +1,104 @@
+# tests/test_revocation_store.py
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.core.security import hash_password
+from app.db.session import AsyncSessionLocal
+from app.models.token_blacklist import TokenBlacklist
+from app.models.users import User
+from app.services import revocation_store
+from app.services.revocation_store import RedisRevocationStore
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRedis:
+    """只實作 RedisRevocationStore 用到的 SET EX / EXISTS（以可調整的時鐘模擬 TTL）。"""
+
+    def __init__(self):
+        self.now = time.monotonic()
+        self.data: Dict[str, Tuple[str, Optional[float]]] = {}
+
+    def _alive(self, key: str) -> bool:
+        item = self.data.get(key)
+        if item is None:
+            return False
+        if item[1] is not None and item[1] <= self.now:
+            del self.data[key]
+            return False
+        return True
+
+    async def set(self, key: str, value: str, ex: Optional[int] = None):
+        self.data[key] = (value, self.now + ex if ex else None)
+        return True
+
+    async def exists(self, *keys: str) -> int:
+        return sum(1 for k in keys if self._alive(k))
+
+    def ttl(self, key: str) -> float:
+        return self.data[key][1] - self.now
+
+
+@pytest.fixture
+def fake_redis():
+    fake = FakeRedis()
+    revocation_store.configure_revocation_store("redis", client=fake)
+    yield fake
+    revocation_store.configure_revocation_store()
+
+
+async def test_redis_store_ttl_matches_remaining_lifetime(fake_redis):
+    store = RedisRevocationStore(client=fake_redis, prefix="t:")
+    jti = str(uuid4())
+    await store.revoke(None, jti, "access", 1, datetime.utcnow() + timedelta(seconds=120))
+    assert await store.is_revoked(None, jti) is True
+    assert 118 <= fake_redis.ttl(f"t:{jti}") <= 121
+
+    # 已過期的 token 不需寫入
+    stale = str(uuid4())
+    await store.revoke(None, stale, "access", 1, datetime.utcnow() - timedelta(seconds=1))
+    assert f"t:{stale}" not in fake_redis.data
+
+    # TTL 到期後自動失效，不需要清理作業
+    fake_redis.now += 121
+    assert await store.is_revoked(None, jti) is False
+
+
+async def test_logout_with_redis_backend_skips_blacklist_table(fake_redis, client: AsyncClient):
+    email, password = f"redis-{uuid4().hex[:8]}@example.com", "Secret123!"
+    session = AsyncSessionLocal()
+    try:
+        session.add(User(email=email, name="Redis", password_hash=hash_password(password), token_version=0))
+        await session.commit()
+    finally:
+        await session.close()
+
+    r = await client.post("/api/v1/auth/login", data={"username": email, "password": password})
+    assert r.status_code == 200, r.text
+    access = r.json()["access_token"]
+    headers = {"Authorization": f"Bearer {access}"}
+    assert (await client.get("/api/v1/auth/me", headers=headers)).status_code == 200
+
+    assert (await client.post("/api/v1/auth/logout", headers=headers)).status_code == 200
+    assert (await client.get("/api/v1/auth/me", headers=headers)).status_code == 401
+
+    assert any(k.startswith("revoked:") for k in fake_redis.data)
+    session = AsyncSessionLocal()
+    try:
+        rows = (await session.execute(
+            select(TokenBlacklist).join(User, TokenBlacklist.user_id == User.id).where(User.email == email)
+        )).all()
+        assert rows == []
+    finally:
+        await session.close()
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        revocation_store.configure_revocation_store("memcached")
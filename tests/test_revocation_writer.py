@@ -0,0 +1,82 @@
+# tests/test_revocation_writer.py
+import asyncio
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+
+from app.core.security import hash_password
+from app.db.session import AsyncSessionLocal
+from app.models.token_blacklist import TokenBlacklist
+from app.models.users import User
+from app.services.revocation_store import is_token_revoked, revoke_token
+from app.services.revocation_writer import WRITER_FLUSHES, revocation_writer
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def writer(monkeypatch):
+    monkeypatch.setattr(revocation_writer, "max_batch", 100)
+    monkeypatch.setattr(revocation_writer, "interval", 0.02)
+    await revocation_writer.start()
+    yield revocation_writer
+    await revocation_writer.stop()
+
+
+async def _count(jtis) -> int:
+    session = AsyncSessionLocal()
+    try:
+        return (await session.execute(
+            select(func.count(TokenBlacklist.id)).where(TokenBlacklist.jti.in_(jtis))
+        )).scalar()
+    finally:
+        await session.close()
+
+
+async def test_concurrent_revocations_share_commits(writer):
+    jtis = [f"wb-{uuid4()}" for _ in range(250)]
+    expires_at = datetime.utcnow() + timedelta(minutes=5)
+    flushes_before = WRITER_FLUSHES.labels("ok")._value.get()
+
+    session = AsyncSessionLocal()
+    try:
+        await asyncio.gather(*(revoke_token(session, j, "access", None, expires_at) for j in jtis))
+        # 尚未寫入 DB 之前，本 worker 已經視為撤銷
+        assert await is_token_revoked(session, jtis[0]) is True
+
+        # 同一個 jti 重複提交（並行登出）不會讓整批 INSERT 失敗
+        await revoke_token(session, jtis[1], "access", None, expires_at)
+        await writer.flush()
+    finally:
+        await session.close()
+
+    assert await _count(jtis) == len(jtis)
+    assert len(writer) == 0
+    # 250 筆撤銷只用了少數幾次 commit（max_batch=100）
+    assert WRITER_FLUSHES.labels("ok")._value.get() - flushes_before <= 5
+
+
+async def test_logout_is_visible_immediately_and_flushed_on_stop(writer, client: AsyncClient):
+    email, password = f"wb-{uuid4().hex[:8]}@example.com", "Secret123!"
+    session = AsyncSessionLocal()
+    try:
+        session.add(User(email=email, name="WB", password_hash=hash_password(password), token_version=0))
+        await session.commit()
+    finally:
+        await session.close()
+
+    r = await client.post("/api/v1/auth/login", data={"username": email, "password": password})
+    assert r.status_code == 200, r.text
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    writer.interval = 60  # 背景 task 不會在測試期間 flush
+    assert (await client.post("/api/v1/auth/logout", headers=headers)).status_code == 200
+    assert (await client.get("/api/v1/auth/me", headers=headers)).status_code == 401
+    pending = list(writer._pending)
+    assert pending
+
+    await writer.stop()  # 與 lifespan 關閉時相同
+    assert await _count(pending) == len(pending)
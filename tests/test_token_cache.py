@@ -0,0 +1,51 @@
+# tests/test_token_cache.py
+import pytest
+from jose import JWTError
+
+from app.core import security
+from app.core.config import settings
+
+
+def _count(result: str) -> float:
+    return security.ACCESS_TOKEN_CACHE_REQUESTS.labels(result)._value.get()
+
+
+def test_repeated_decode_hits_cache():
+    security.clear_access_token_cache()
+    token = security.create_access_token({"sub": "7", "ver": 1})
+
+    misses, hits = _count("miss"), _count("hit")
+    first = security.decode_access_token(token)
+    second = security.decode_access_token(token)
+    assert first == second and second["sub"] == "7"
+    assert _count("miss") == misses + 1
+    assert _count("hit") == hits + 1
+
+    # 回傳的是複本：呼叫端修改不會污染快取
+    second["sub"] = "tampered"
+    assert security.decode_access_token(token)["sub"] == "7"
+
+
+def test_invalid_and_expired_tokens_are_not_cached():
+    security.clear_access_token_cache()
+    with pytest.raises(Exception):
+        security.decode_access_token("not.a.jwt")
+    refresh = security.create_refresh_token({"sub": "1", "ver": 0})
+    with pytest.raises(JWTError):
+        security.decode_access_token(refresh)
+
+    expired = security.create_access_token({"sub": "1", "ver": 0}, expires_minutes=-1)
+    with pytest.raises(JWTError):
+        security.decode_access_token(expired)
+    assert len(security._claims_cache) == 0
+
+
+def test_cache_can_be_disabled(monkeypatch):
+    security.clear_access_token_cache()
+    monkeypatch.setattr(settings, "ACCESS_TOKEN_CACHE_ENABLED", False)
+    token = security.create_access_token({"sub": "1", "ver": 0})
+    hits = _count("hit")
+    security.decode_access_token(token)
+    security.decode_access_token(token)
+    assert _count("hit") == hits
+    assert len(security._claims_cache) == 0
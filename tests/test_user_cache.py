@@ -0,0 +1,93 @@
+# tests/test_user_cache.py
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.core.cache import TTLCache
+from app.core.security import hash_password
+from app.db.session import AsyncSessionLocal
+from app.models.users import User
+from app.services.user_cache import USER_CACHE_REQUESTS
+
+pytestmark = pytest.mark.anyio
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_cache_expiry_lru_and_weight():
+    clock = _Clock()
+    c = TTLCache(maxsize=2, ttl=10, max_weight=100, clock=clock)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1  # a 變成最近使用
+    c.set("c", 3)  # 超過 maxsize → 淘汰最久未用的 b
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+
+    clock.now = 10.0
+    assert c.get("a") is None  # 過期
+
+    c.set("big", "x", weight=80)
+    c.set("big2", "y", weight=80)  # 超過總權重 → 淘汰 big
+    assert c.get("big") is None and c.get("big2") == "y"
+    assert c.weight == 80
+
+    c.set("short", 1, ttl=1)
+    clock.now = 11.5
+    assert c.get("short") is None
+
+
+def _hits() -> float:
+    return USER_CACHE_REQUESTS.labels("hit")._value.get()
+
+
+async def _ensure_user(email: str, password: str) -> None:
+    session = AsyncSessionLocal()
+    try:
+        res = await session.execute(select(User).where(User.email == email))
+        if res.scalar_one_or_none() is None:
+            session.add(User(email=email, name="Cache", password_hash=hash_password(password), token_version=0))
+            await session.commit()
+    finally:
+        await session.close()
+
+
+async def _login(client: AsyncClient, email: str, password: str) -> str:
+    r = await client.post(
+        "/api/v1/auth/login",
+        data={"username": email, "password": password},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    assert r.status_code == 200, r.text
+    return r.json()["access_token"]
+
+
+async def test_cached_endpoints_and_logout_all_invalidation(client: AsyncClient):
+    email, password = "cache@example.com", "CachePass123"
+    await _ensure_user(email, password)
+    access = await _login(client, email, password)
+    headers = {"Authorization": f"Bearer {access}"}
+
+    r = await client.get("/api/v1/auth/test-token", headers=headers)
+    assert r.status_code == 200, r.text
+    before = _hits()
+    r = await client.get("/api/v1/auth/me", headers=headers)
+    assert r.status_code == 200 and r.json()["email"] == email
+    assert _hits() == before + 1
+
+    # logout-all 後本 worker 的快取立即更新，舊 token 不可再用
+    r = await client.post("/api/v1/auth/logout-all", headers=headers)
+    assert r.status_code == 200, r.text
+    r = await client.get("/api/v1/auth/test-token", headers=headers)
+    assert r.status_code == 401
+
+    # 新登入的 token（ver 較新）可正常使用
+    access2 = await _login(client, email, password)
+    r = await client.get("/api/v1/meals/", headers={"Authorization": f"Bearer {access2}"})
+    assert r.status_code == 200